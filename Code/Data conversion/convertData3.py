@@ -1,11 +1,13 @@
 from os import listdir
-from os.path import isfile, join
+from os.path import abspath, dirname, isfile, join
 import sys
 import csv
 import datetime
 import pytz
 import re
 from pymongo import MongoClient
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import ingestion
 
 
 # Procedure that takes as input a tab-delimited txt file, and stores the data as a list, 
@@ -21,13 +23,20 @@ def parseCSV(filePath, data):
 
 # Procedure that takes as input the directory path containing the tab-delimited text files
 # that need converting, and the collection in the MongoDB database to which this data needs
-# to be transferred.
+# to be transferred. The rows of each file are inserted in bulk, and rows whose user name and
+# epoch time are already in the collection are skipped.
 
 def convertJSON(dirPath, gpsPoints):
     
     dataFiles = [ f for f in listdir(dirPath) if isfile(join(dirPath,f)) ]    
+    indexError = ingestion.ensureUniqueIndex(gpsPoints)
+    if indexError is not None:
+        print 'Could not build the unique index, points already in the collection are looked up instead:'
+        print indexError
+    numInserted, numSkipped = 0, 0
     for dataFile in dataFiles:
         print 'Processing ' + dataFile
+        records = []
         try:            
             gpsTraces = []
             filePath = dirPath + dataFile
@@ -77,13 +86,20 @@ def convertJSON(dirPath, gpsPoints):
                     elif len(row) > 19:
                         record['groundTruth']['exactLocation'] = row[19]
                 
-                if gpsPoints.find({'userName':userName, 'epochTime': float(row[1])}).count() == 0:
-                    gpsPoints.insert(record)
-                    #print record
+                records.append(record)
                 
         except:
             print "Unexpected error:", sys.exc_info()[0]
             pass
+        try:
+            inserted, skipped = ingestion.insertRecords(gpsPoints, records, indexError is None)
+        except:
+            print "Unexpected error while inserting points:", sys.exc_info()[0]
+            continue
+        print 'Inserted %d points, skipped %d points already in the database' % (inserted, skipped)
+        numInserted, numSkipped = numInserted + inserted, numSkipped + skipped
+
+    print 'Total: inserted %d points, skipped %d points' % (numInserted, numSkipped)
     
 
 # Entry point to script
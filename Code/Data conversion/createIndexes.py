@@ -0,0 +1,33 @@
+from os.path import abspath, dirname, join
+import sys
+from pymongo import MongoClient
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import indexes
+
+
+# Procedure that takes as input the travelDiary database, creates the indexes of the gpsPoints and segments
+# collections, and checks that the queries run by the inference scripts are answered by index scans, without
+# reading every document of a collection or sorting the results in memory.
+
+def createIndexes(travelDiary):
+
+    for name, keys, message in indexes.ensureTravelDiaryIndexes(travelDiary):
+        print 'Could not create index', keys, 'on', name + ':', message
+
+    problems = indexes.checkQueryPlans(travelDiary)
+    for description, problem in problems:
+        print description + ':', problem
+    if not problems:
+        print 'All queries are answered by index scans'
+
+
+# Entry point to script
+
+if __name__ == "__main__":
+
+    # Mongo database details
+    client = MongoClient()
+    travelDiary = client.travelDiary
+
+    # Call to function
+    createIndexes(travelDiary)
@@ -3,6 +3,10 @@ import numpy as np
 import datetime
 import dateutil.parser
 import matplotlib.pyplot as plt
+import sys
+from os.path import abspath, dirname, join
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary.neighborhoods import ActivityNeighborhoods
 
 
 def idDestinations(activity):
@@ -33,17 +37,18 @@ if __name__ == "__main__":
         query = {'phNum': testPhone}
         projection = {'trackPoints': 0}
         activities = list(segments.find(query, projection).sort('duration'))
+        
+        # Activities within 100 meters of each activity, found with an in-memory index of the centroids
+        # rather than one $nearSphere query per activity
+        centroids = [activity['centroid']['coordinates'] for activity in activities]
+        neighborhoods = ActivityNeighborhoods(centroids, [activity['duration'] for activity in activities])
+        neighbors = neighborhoods.findNeighbors(centroids, 100)
+        
         destinations, totalDuration = [], 0
-        for activity in activities:
+        for activity, nearby in zip(activities, neighbors):
             totalDuration += activity['duration']
             nearbyDuration, nearbyPurpose = 0, []
-            centroid = activity['centroid']['coordinates']
-            query = {'centroid': {'$nearSphere': {'$geometry': {'type': 'Point',
-                                                                'coordinates': [centroid[0], centroid[1]]},
-                                                  '$maxDistance': 100}},
-                     'phNum': testPhone}
-            nearbyActivities = segments.find(query, projection)
-            for nearbyActivity in nearbyActivities:
+            for nearbyActivity in [activities[k] for k in nearby]:
                 nearbyDuration += nearbyActivity['duration']
                 for purpose in nearbyActivity['purpose']:
                     if purpose not in nearbyPurpose:
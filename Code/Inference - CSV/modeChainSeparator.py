@@ -1,192 +1,48 @@
-import math
+import numpy
+import multiprocessing
 from os import listdir
-from os.path import isfile, join
+from os.path import abspath, dirname, isfile, join
 import sys
-import tripActivitySeparator 
+import traceback
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import accuracy, parallel
+from travelDiary.traces import asGpsTrace
+from travelDiary.segments import SegmentAggregates
+from travelDiary.cache import loadGpsTrace
+from travelDiary.modeChains import inferModeChain
+from travelDiary.tripActivity import inferTripActivity
 
 
-# Function that calculates the initial bearing in degrees from point 1 to point 2, given the 
-# latitude and longitude of both points
-
-def calBearing(point1, point2):
-
-    dLon = math.radians(point2[1]-point1[1])    
-    lat1 = math.radians(point1[0])
-    lat2 = math.radians(point2[0])
-    
-    y = math.sin(dLon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
-    b = math.atan2(y, x)
-
-    return math.degrees(b)
-
-
-# Functions that calculate the four features of a GPS point: distance to next point (in meters), 
-# time interval (seconds), speed (mph) and acceleration (mph2)
-
-def lengthPoint(gpsTraces, j):
-   return tripActivitySeparator.calDistance(gpsTraces[j][2:4], gpsTraces[j+1][2:4])
-
-def timePoint(gpsTraces, j):
-   return (gpsTraces[j+1][1] - gpsTraces[j][1]) / 1000.0
-
-def speedPoint(gpsTraces, j):
-  return 2.23694 * (float(lengthPoint(gpsTraces, j)) / timePoint(gpsTraces, j))
-
-def accelerationPoint(gpsTraces, j):
-  return abs(speedPoint(gpsTraces, j + 1) - speedPoint(gpsTraces, j)) / (timePoint(gpsTraces,j) / 3600.0)
-
-def headingChange(gpsTraces, j):
-    return math.fabs(calBearing(gpsTraces[j][2:4], gpsTraces[j + 1][2:4]) 
-            - calBearing(gpsTraces[j + 1][2:4], gpsTraces[j + 2][2:4]))    
-    
-    
-# Methods that takes an input the GPS data and the index of a particular point in the data, and returns
-# a list contanining the features of that point
-
-def determineFeatures(gpsTraces, i):
-    
-    features = {}
-    features['Speed'] = speedPoint(gpsTraces, i)
-    features['Acceleration'] = accelerationPoint(gpsTraces, i)
-    features['Heading Change'] = headingChange(gpsTraces, i)
-    return features
-    
-
-# Method that that takes as input the list containing GPS data, called gpsTraces, and a tuple containing the 
-# indices of the start and end point of a trip, called trip.
-#
-# The trips are decomposed into their mode chains. 
-
-def inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration, 
-        minSegmentDuration, minSegmentLength, gpsAccuracyThreshold):
-
-    # Step 1: Label GPS points as walk points or non-walk points    
-    walkDummy = {}
-    i = trip[0]
-    while i < trip[1]:
-        start, end = i, i
-        while end < trip[1] and (gpsTraces[end][4] > gpsAccuracyThreshold 
-                or gpsTraces[end + 1][4] > gpsAccuracyThreshold
-                or gpsTraces[end + 2][4] > gpsAccuracyThreshold):
-            end += 1
-        if start == end:
-            features = determineFeatures(gpsTraces, i)            
-            if features['Acceleration'] <= 945:
-                if features['Heading Change'] <= 0.0000:
-                    walkDummy[i] = 0
-                elif features['Speed'] <= 8.0205:
-                    walkDummy[i] = 1
-                else:
-                    walkDummy[i] = 0
-            else:
-                walkDummy[i] = 0
-	    i += 1            
-	else:
-	    distance = tripActivitySeparator.calDistance(gpsTraces[start][2:4], gpsTraces[end][2:4])
-	    time = (gpsTraces[end][1] - gpsTraces[start][1]) / 1000.0
-	    speed = 2.23694 * (float(distance) / time)
-	    dummy = int(speed < maxWalkSpeed)
-            while i < end:
-                walkDummy[i] = dummy
-                i += 1
-    print walkDummy 
-    print
-    
-    # Step 2: Identify walk and non-walk segments as consecutive walk or non-walk points 
-    modeChains = []
-    beginSegment = trip[0]
-    currentPoint = trip[0] + 1
-    while currentPoint < trip[1]:
-        if walkDummy[currentPoint] != walkDummy[beginSegment]:
-            modeChains.append([beginSegment, currentPoint, int(walkDummy[beginSegment] != 0)])
-            beginSegment = currentPoint
-        currentPoint += 1
-    modeChains.append([beginSegment, currentPoint, int(walkDummy[beginSegment] != 0)])
-    print modeChains
-    print
-
-    # Step 3: If the time span of a segment is greater than minSegmentDuration milliseconds, label it 
-    # as certain. If it is less than minSegmentDuration milliseconds, and its backward segment is certain,
-    # merge it with the backward segment. If no certain backward segment exists, label the segment as 
-    # uncertain, and save it as an independent segment. 
-    newModeChains = []
-    for i in range(0, len(modeChains)):
-        if gpsTraces[modeChains[i][1]][1] - gpsTraces[modeChains[i][0]][1] >= minSegmentDuration:
-            modeChains[i].append(1)
-            newModeChains.append(modeChains[i])
-        elif newModeChains and newModeChains[-1][-1] == 1:
-            newModeChains[-1][1] = modeChains[i][1]
-        else:
-            modeChains[i].append(0)
-            newModeChains.append(modeChains[i])
-    modeChains = newModeChains
-    print modeChains
-    print
-
-    # Step 4: Merge consecutive uncertain segments into a single certain segment. Calculate average
-    # speed over segment and compare it against maxWalkSpeed to determine whether walk or non-walk.
-    # Check if this segment exceeds minSegmentDuration milliseconds. If it doesn't, and there exists 
-    # a certain forward segment, merge the new segment with this forward segment. 
-    newModeChains, i = [modeChains[0][0:-1]], 1
-    while i < len(modeChains) and modeChains[i][-1] == 0:
-        i += 1
-    if i > 1:
-        newModeChains[0][1] = modeChains[i-1][1]
-        distance = tripActivitySeparator.calDistance(gpsTraces[newModeChains[0][0]][2:4], gpsTraces[newModeChains[0][1]][2:4])
-        time = (gpsTraces[newModeChains[0][1]][1] - gpsTraces[newModeChains[0][0]][1]) / 1000.0
-        speed = 2.23694 * (float(distance) / time)
-        newModeChains[0][-1] = int(speed < maxWalkSpeed)
-    if i < len(modeChains) and modeChains[0][-1] == 0:
-        time = (gpsTraces[newModeChains[0][1]][1] - gpsTraces[newModeChains[0][0]][1])
-        if time < minSegmentDuration:
-            modeChains[i][0] = trip[0]
-            newModeChains = []
-    while i < len(modeChains):
-        newModeChains.append(modeChains[i][:-1])
-        i += 1
-    modeChains = newModeChains
-    print modeChains
-    print
-        
-    # Step 5: Merge consecutive walk segments and consecutive non-walk segments
-    newModeChains = [modeChains[0]]
-    for i in range(1, len(modeChains)):
-        if modeChains[i][2] == newModeChains[-1][2]:
-            newModeChains[-1][1] = modeChains[i][1]
-        else:
-            newModeChains.append(modeChains[i])
-    modeChains = newModeChains    
-
-    return modeChains
-    
-
 # Method that takes as input the GPS data, and the inferred mode chains, and returns the total time elapsed 
 # and distance covered over the dataset inferred as trips, and the time and distance correctly inferred
 # as either a walk segment or non-walk segment
 
 def calInfAccuray(modeChains, gpsTraces):
     
+    gpsTraces = asGpsTrace(gpsTraces)
+    isTrip, isWalk = gpsTraces.isLabel('label', 'Trip'), gpsTraces.isLabel('type', 'Walk')
+    isWalkTrip, isNonWalkTrip = (isTrip & isWalk)[:-1], (isTrip & ~isWalk)[:-1]
+    walkCounts = accuracy.countInIntervals(modeChains, isWalkTrip)
+    nonWalkCounts = accuracy.countInIntervals(modeChains, isNonWalkTrip)
+
+    # Sums of the time, in milliseconds, and distance, in miles, over the walk and non-walk points of every
+    # segment, and of the distance over all its points
+    stepTimes, stepDistances = numpy.diff(gpsTraces.epochTime), gpsTraces.derived('stepDistance')/1609.34
+    distances = SegmentAggregates(stepDistances)
+    inferredTimes = [SegmentAggregates(numpy.where(isNonWalkTrip, stepTimes, 0)), 
+            SegmentAggregates(numpy.where(isWalkTrip, stepTimes, 0))]
+    inferredDistances = [SegmentAggregates(numpy.where(isNonWalkTrip, stepDistances, 0.0)), 
+            SegmentAggregates(numpy.where(isWalkTrip, stepDistances, 0.0))]
+
     timeTotal, timeInferred, distTotal, distInferred = 0, 0, 0, 0
     segTotal, segInferred, segWalkInfNonWalk, segNonWalkInfWalk = 0, 0, 0, 0
-    for modeChain in modeChains:
+    for modeChain, walk, nonWalk in zip(modeChains, walkCounts, nonWalkCounts):
         segTotal += 1
-        walk, nonWalk, activity = 0, 0, 0
-        for i in range(modeChain[0], modeChain[1]):
-            timeTotal += ((gpsTraces[i+1][1] - gpsTraces[i][1])/1000.0)
-            distTotal += (tripActivitySeparator.calDistance(gpsTraces[i][2:4], gpsTraces[i+1][2:4])/1609.34)            
-
-            if gpsTraces[i][10] == 'Trip' and gpsTraces[i][11] == 'Walk':
-                walk += 1
-            elif gpsTraces[i][10] == 'Trip':
-                nonWalk += 1
-            else:
-                activity += 1
-                        
-            if ((modeChain[-1] == 1 and gpsTraces[i][10] == 'Trip' and gpsTraces[i][11] == 'Walk') or
-                    (modeChain[-1] == 0 and gpsTraces[i][10] == 'Trip' and gpsTraces[i][11] != 'Walk')):
-                timeInferred += ((gpsTraces[i+1][1] - gpsTraces[i][1])/1000.0)
-                distInferred += (tripActivitySeparator.calDistance(gpsTraces[i][2:4], gpsTraces[i+1][2:4])/1609.34)
+        activity = max(0, modeChain[1] - modeChain[0]) - walk - nonWalk
+        timeTotal += gpsTraces.segmentTime(modeChain[0], modeChain[1])
+        distTotal += distances.sum(modeChain[0], modeChain[1])
+        timeInferred += inferredTimes[modeChain[-1]].sum(modeChain[0], modeChain[1])/1000.0
+        distInferred += inferredDistances[modeChain[-1]].sum(modeChain[0], modeChain[1])
 
         if ((max(walk, nonWalk, activity) == walk and modeChain[-1] == 1) 
                 or (max(walk, nonWalk, activity) == nonWalk and modeChain[-1] == 0)):
@@ -200,6 +56,31 @@ def calInfAccuray(modeChains, gpsTraces):
             segTotal, segInferred, segWalkInfNonWalk, segNonWalkInfWalk)  
 
 
+# Function that takes as input the path to a GPS data file, separates its GPS points into trips and activities,
+# and each trip into a chain of walk and non-walk segments. Output is a tuple containing the trips, activities and
+# holes, a list with one tuple (trip, modeChains, accuracy) per trip, where accuracy is the tuple returned by
+# calInfAccuray, and the traceback of any exception raised along the way, or None. The trips processed before
+# such an exception are kept, so that they count towards the accuracy as before.
+
+def evaluateFile(filePath):
+    tripActivities, tripResults = (None, None, None), []
+    try:
+        gpsTraces = loadGpsTrace(filePath)
+        minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
+        minSeparationDistance, minSeparationTime = 100, 360000
+        tripActivities = inferTripActivity(gpsTraces, minDuration, maxRadius, 
+                minSeparationDistance, minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
+        
+        maxWalkSpeed, maxWalkAcceleration, minSegmentDuration, minSegmentLength = 5, 1620, 90000, 200
+        for trip in tripActivities[0]:
+            modeChains = inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration, 
+                    minSegmentDuration, minSegmentLength, gpsAccuracyThreshold)
+            tripResults.append((trip, modeChains, calInfAccuray(modeChains, gpsTraces)))
+    except Exception:
+        return tripActivities, tripResults, traceback.format_exc()
+    return tripActivities, tripResults, None
+
+
 # Procedure that takes as input a string containing the path to the dircetory containing the GPS data files,
 # and calculates for each file the travel mode chain for each trip. Output is the accuracy of the inference
 # when matched against the ground truth, also contained in the GPS data files.
@@ -219,36 +100,36 @@ def calInfAccuray(modeChains, gpsTraces):
 # or (2) Activity, if the individual at the time was engaging in an activity. Columns twelve to fourteen 
 # are strings containing information regarding the trip or activity.
 #
+# Files written by later versions of the tracking app contain nineteen columns instead, with the ground truth
+# from the nineteenth column onwards, and some files of the earlier version leave the eleventh column empty,
+# with the ground truth from the twelfth column onwards. The ground truth is still read from the eleventh to
+# fourteenth columns for these files, so that none of their points are counted as correctly inferred.
+#
 # Finally, the rows in the file should be ordered in terms of increasing time. 
+#
+# The files are processed by numWorkers worker processes, and the results are reported and summed in order of
+# file name, so that the output does not depend on the number of workers.
 
-def modeChainSeparator(dirPath):
-    dataFiles = [ f for f in listdir(dirPath) if isfile(join(dirPath,f)) ]
+def modeChainSeparator(dirPath, numWorkers = 1):
+    dataFiles = sorted([ f for f in listdir(dirPath) if isfile(join(dirPath,f)) ])
+    results = parallel.mapTasks(evaluateFile, [dirPath + dataFile for dataFile in dataFiles], numWorkers)
     
     timeTotTrips, timeInfTrips, distTotTrips, distInfTrips = 0, 0, 0, 0
     segTotTrips, segInfTrips, segWalkInfNonWalkTrips, segNonWalkInfWalkTrips = 0, 0, 0, 0
-    for dataFile in dataFiles:
-        gpsTraces = []
-        filePath = dirPath + dataFile
-        try:
-            print dataFile + '\n'
-            tripActivitySeparator.parseCSV(filePath, gpsTraces)
-            minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
-            minSeparationDistance, minSeparationTime = 100, 360000
-            trips, activities, holes = tripActivitySeparator.inferTripActivity(gpsTraces, minDuration, maxRadius, 
-                    minSeparationDistance, minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
-            print trips, activities, holes
-            print
-            
-            maxWalkSpeed, maxWalkAcceleration, minSegmentDuration, minSegmentLength = 5, 1620, 90000, 200
-            for trip in trips:
+    for dataFile, (result, error) in zip(dataFiles, results):
+        print dataFile + '\n'
+        if result is not None:
+            (trips, activities, holes), tripResults, error = result
+            if trips is not None:
+                print trips, activities, holes
+                print
+            for trip, modeChains, accuracy in tripResults:
                 print trip
                 print
-                modeChains = inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration, 
-                        minSegmentDuration, minSegmentLength, gpsAccuracyThreshold)
                 print modeChains
                 print
                 (timeTotal, timeInferred, distTotal, distInferred, segTotal, segInferred, 
-                        segWalkInfNonWalk, segNonWalkInfWalk) = calInfAccuray(modeChains, gpsTraces)           
+                        segWalkInfNonWalk, segNonWalkInfWalk) = accuracy
                 timeTotTrips += timeTotal
                 timeInfTrips += timeInferred
                 distTotTrips += distTotal
@@ -257,9 +138,9 @@ def modeChainSeparator(dirPath):
                 segInfTrips += segInferred
                 segWalkInfNonWalkTrips += segWalkInfNonWalk
                 segNonWalkInfWalkTrips += segNonWalkInfWalk
-        except:
-            print "Unexpected error:", sys.exc_info()[0]
-            pass
+        if error is not None:
+            print "Unexpected error in " + dataFile + ":"
+            print error
     
     print 'Accuracy in terms of time: ' + str(round((timeInfTrips*100)/timeTotTrips, 2)) + '%'
     print 'Accuracy in terms of distance: ' + str(round((distInfTrips*100)/distTotTrips, 2)) + '%'
@@ -273,8 +154,6 @@ def modeChainSeparator(dirPath):
 # Entry point to script
 
 if __name__ == "__main__":
-    
-    reload(tripActivitySeparator)
 
     # Base directory where you clone the repository, change as appropriate
     dirPath = '/Users/vij/Work/Current Research/'
@@ -282,5 +161,8 @@ if __name__ == "__main__":
     # Folder within the repository containing the data files
     dirPath += 'Travel-Diary/Data/Temp/'
     
+    # Number of worker processes used to process the data files, change as appropriate
+    numWorkers = multiprocessing.cpu_count()
+    
     # Call to function
-    modeChainSeparator(dirPath)
\ No newline at end of file
+    modeChainSeparator(dirPath, numWorkers)
\ No newline at end of file
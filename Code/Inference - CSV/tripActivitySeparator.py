@@ -1,185 +1,13 @@
-import csv
-import math
 import numpy
+import multiprocessing
 from os import listdir
-from os.path import isfile, join
+from os.path import abspath, dirname, isfile, join
 import sys
-
-
-# Procedure that takes as input a tab-delimited txt file, and stores the data as a list, 
-# where each element of the list is a list itself that corresponds to a row in the file,
-# and each element of that list corresponds to an entry in that row. 
-
-def parseCSV(filePath, data):
-    with open(filePath, 'rU') as csvfile:
-        for row in csv.reader(csvfile, delimiter = '\t'):
-            tList = []
-            for element in row:
-                try:
-                    tList.append(float(element))    
-                except:
-                    tList.append(element)    
-            data.append(tList)
-
-
-# Function that uses the haversine formula to calculate the 'great-circle' distance in meters
-# between two points whose latitutde and longitude are known
-
-def calDistance(point1, point2):
-
-    earthRadius = 6371000 
-    dLat = math.radians(point1[0]-point2[0])
-    dLon = math.radians(point1[1]-point2[1])    
-    lat1 = math.radians(point1[0])
-    lat2 = math.radians(point2[0])
-    
-    a = (math.sin(dLat/2) ** 2) + ((math.sin(dLon/2) ** 2) * math.cos(lat1) * math.cos(lat2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    d = earthRadius * c 
-    
-    return d
-
-
-# Function that takes as input a point and a list of points, where a point is itself a list containing 
-# the elements in the row in the input file corresponding to that point. The function outputs the maximum 
-# distance, in meters, from the 95% CI around that point to the 95% CI around any point in the list of points
-
-def calDistanceToPoint(point, points):
-    maxDistance = 0
-    for i in range(0, len(points)):
-        dist = calDistance(point[2:4], points[i][2:4]) - point[4] - points[i][4]
-        if dist > maxDistance:
-            maxDistance = dist
-    return maxDistance
-    
-
-# Function that takes as input two lists of points, where a point is itself a list containing 
-# the elements in the row in the input file corresponding to that point. The function outputs the 
-# distance, in meters, between the median points in the two lists
-
-def calDistanceBetweenPoints(points1, points2):
-    latLon1, latLon2 = numpy.zeros(shape = (len(points1), 2)), numpy.zeros(shape = (len(points2), 2))
-    for i in range(0, len(points1)):
-        latLon1[i, 0] = points1[i][2]
-        latLon1[i, 1] = points1[i][3]
-    for i in range(0, len(points2)):
-        latLon2[i, 0] = points2[i][2]
-        latLon2[i, 1] = points2[i][3]
-    point1 = [numpy.median(latLon1[:, 0]), numpy.median(latLon1[:, 1])]
-    point2 = [numpy.median(latLon2[:, 0]), numpy.median(latLon2[:, 1])]    
-    return calDistance(point1, point2)
-
-
-# Procedure that takes as input the start and end points to an event, the list of events and holes,
-# the list comprising the raw GPS data and the threshold for labelling a gap in the data a hole,
-# and infers holes in the data and splits the event accordingly into multiple events
-
-def inferHoles(eventStart, eventEnd, events, holes, gpsTraces, minSamplingRate):
-    j = eventStart + 1
-    while j <= eventEnd:
-        while (j < eventEnd and 
-                gpsTraces[j][1] - gpsTraces[j - 1][1] < minSamplingRate):
-            j += 1
-        if gpsTraces[j][1] - gpsTraces[j - 1][1] >= minSamplingRate:
-            holes.append([j - 1, j])
-            if j - 1 > eventStart:
-                events.append([eventStart, j - 1])
-        else:
-            events.append([eventStart, j])
-        eventStart, j = j, j + 1
-    
-    
-# Method that takes as input the list containing GPS data, called gpsTraces, and two empty lists, 
-# called trips and activities. 
-#
-# Each element of trips is a tuple and corresponds to a particular trip. The elements of the tuple are the 
-# indices of the corresponding GPS data points in gpsTraces for where the trip began and ended, respectively.
-# Similarly, each element of activities is a tuple and corresponds to a particular activity. The elements 
-# of the tuple are the indices of the corresponding GPS data point in gpsTraces for where the activity began 
-# and ended, respectively.
-# 
-# An activity is defined as a set of GPS points over a minimum duration of minDuration milliseconds that fall within 
-# a circle of radius maxRadius meters. The minimum interval between successive activites must be at least 
-# minInterval milliseconds, for them to be recorded as separate activities.
-#
-# GPS traces whose accuracy is above gpsAccuracyThreshold meters are ignored.
-
-def inferTripActivity(gpsTraces, minDuration, maxRadius, minSeparationDistance, 
-        minSeparationTime, minSamplingRate, gpsAccuracyThreshold):
-    
-    trips, activities, holes = [], [], []
-    
-    # Infer activities
-    i = 0
-    while i < len(gpsTraces) - 1:
-               
-        # Skip over any black points at the beginning 
-        while i < len(gpsTraces) - 1 and gpsTraces[i][4] >= gpsAccuracyThreshold:
-            i += 1
-
-        # Create a collection of successive points that lie within a circle of radius maxRadius meters, such that no
-        # two consecutive points in space are separated by more than minSamplingRate milliseconds
-        j = i + 1
-        points = [gpsTraces[i]]
-        while (j < len(gpsTraces) and gpsTraces[j][4] < gpsAccuracyThreshold 
-                and gpsTraces[j][1] - gpsTraces[j-1][1] < minSamplingRate
-                and calDistanceToPoint(gpsTraces[j], points) < maxRadius):
-            points.append(gpsTraces[j])
-            j += 1
-        
-        # Check for black points
-        k = j 
-        while k < len(gpsTraces) and gpsTraces[k][4] >= gpsAccuracyThreshold:
-            k += 1
-        if k > j:
-            if k < len(gpsTraces):
-                if calDistanceToPoint(gpsTraces[k], points) < maxRadius:
-                    j = k + 1
-
-        # Check if the duration over which these points were collected exceeds minDuration milliseconds
-        if gpsTraces[j-1][1] - gpsTraces[i][1] > minDuration:
-            
-            # Check if the activity is separated in space from previous activity by at least minSeparationDistance meters
-            # and separated in time by minSeparationTime milliseconds
-            if (len(activities) > 0 and gpsTraces[j-1][1] - gpsTraces[activities[-1][1]][1] < minSeparationTime
-                    and calDistanceBetweenPoints(gpsTraces[activities[-1][0]:activities[-1][1]], 
-                    gpsTraces[i:j-1]) < minSeparationDistance):                
-                activities[-1][-1] = j-1
-            else:
-                activities.append([i, j-1])
-            i = j - 1
-        else:
-            i += 1
-        
-        if k == len(gpsTraces):
-            break
-        
-    # Impute trips and identify holes in data
-    numActivities, newActivities = len(activities), []
-    if numActivities != 0:
-        
-        # Check if the GPS log begins with a trip
-        if activities[0][0] != 0:
-            inferHoles(0, activities[0][0], trips, holes, gpsTraces, minSamplingRate)
-        
-        # Interpolate trips from activities and identify holes in activities
-        if numActivities > 1:
-            for i in range(0, numActivities - 1):            
-                inferHoles(activities[i][0], activities[i][1], newActivities, holes, gpsTraces, minSamplingRate)
-                inferHoles(activities[i][1], activities[i + 1][0], trips, holes, gpsTraces, minSamplingRate)
-        
-        # Identify holes in the last activity
-        inferHoles(activities[-1][0], activities[-1][1], newActivities, holes, gpsTraces, minSamplingRate)
-
-        # Check if the GPS log ends with a trip
-        if activities[-1][-1] < len(gpsTraces) - 2:
-            inferHoles(activities[-1][1], len(gpsTraces) - 2, trips, holes, gpsTraces, minSamplingRate)
-    
-    # If the data comprises a single trip
-    else:
-        trips.append([0, len(gpsTraces)-1])
-    
-    return trips, newActivities, holes
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import accuracy, clusterSeparator, parallel
+from travelDiary.traces import asGpsTrace
+from travelDiary.cache import loadGpsTrace
+from travelDiary.tripActivity import inferTripActivity
 
 
 # Method that takes as input the GPS data, and the inferred trips and activities, and returns the 
@@ -188,28 +16,45 @@ def inferTripActivity(gpsTraces, minDuration, maxRadius, minSeparationDistance,
 
 def calInfAccuray(trips, activities, gpsTraces):
     
-    tripsInferred = []
-    for trip in trips:
-        tripsInferred += range(trip[0], trip[1])
-    
-    activitiesInferred = []
-    for activity in activities:
-        activitiesInferred += range(activity[0], activity[1])
+    gpsTraces = asGpsTrace(gpsTraces)
+    numPoints = len(gpsTraces)
+    tripsInferred = accuracy.intervalMask(trips, numPoints)
+    activitiesInferred = accuracy.intervalMask(activities, numPoints)
+    isTrip, isActivity = gpsTraces.isLabel('label', 'Trip'), gpsTraces.isLabel('label', 'Activity')
+    isInferred = ((isTrip & tripsInferred) | (isActivity & activitiesInferred))[:-1]
+
+    stepTimes = gpsTraces.derived('stepTime')
+    stepDistances = gpsTraces.derived('stepDistance')/1609.34
+    allPoints = numpy.ones(stepTimes.shape[0], dtype = bool)
+
+    timeTotal, timeInferred = accuracy.maskedSum(stepTimes, allPoints), accuracy.maskedSum(stepTimes, isInferred)
+    distTotal = accuracy.maskedSum(stepDistances, allPoints)
+    distInferred = accuracy.maskedSum(stepDistances, isInferred)
+    return timeTotal, timeInferred, distTotal, distInferred 
 
-    timeTotal, timeInferred, distTotal, distInferred = 0, 0, 0, 0
-    for i in range(0, len(gpsTraces) - 1):
-        timeTotal += ((gpsTraces[i+1][1] - gpsTraces[i][1])/1000.0)
-        distTotal += (calDistance(gpsTraces[i][2:4], gpsTraces[i+1][2:4])/1609.34)            
 
-        if gpsTraces[i][10] == 'Trip' and i in tripsInferred:
-            timeInferred += ((gpsTraces[i+1][1] - gpsTraces[i][1])/1000.0)
-            distInferred += (calDistance(gpsTraces[i][2:4], gpsTraces[i+1][2:4])/1609.34)
+# Function that takes as input the path to a GPS data file, and separates its GPS points into trips and activities.
+# Output is a tuple containing the trips, activities and holes, and the tuple returned by calInfAccuray.
+
+def evaluateFile(filePath):
+    minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
+    minSeparationDistance, minSeparationTime = 100, 360000
+    gpsTraces = loadGpsTrace(filePath)
+    trips, activities, holes = inferTripActivity(gpsTraces, minDuration, maxRadius, minSeparationDistance, 
+            minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
+    return (trips, activities, holes), calInfAccuray(trips, activities, gpsTraces)
 
-        if gpsTraces[i][10] == 'Activity' and i in activitiesInferred:
-            timeInferred += ((gpsTraces[i+1][1] - gpsTraces[i][1])/1000.0)
-            distInferred += (calDistance(gpsTraces[i][2:4], gpsTraces[i+1][2:4])/1609.34)
-        
-    return timeTotal, timeInferred, distTotal, distInferred 
+
+# Function that takes as input the path to a GPS data file, and separates its GPS points into trips and activities
+# with the DBSCAN-based clustering of clusterSeparator, with the parameters of the MATLAB prototype. Output is a
+# tuple as returned by evaluateFile, so that the accuracy of the two algorithms can be compared.
+
+def evaluateFileClustering(filePath):
+    minDuration, eps, minSamplingRate, gpsAccuracyThreshold = 180000, 20, 300000, 200
+    gpsTraces = loadGpsTrace(filePath)
+    trips, activities, holes = clusterSeparator.inferTripActivity(gpsTraces, minDuration, eps, 
+            minSamplingRate, gpsAccuracyThreshold)
+    return (trips, activities, holes), calInfAccuray(trips, activities, gpsTraces)
 
 
 # Procedure that takes as input a string containing the path to the dircetory containing the GPS data files,
@@ -231,31 +76,34 @@ def calInfAccuray(trips, activities, gpsTraces):
 # or (2) Activity, if the individual at the time was engaging in an activity. Columns twelve to fourteen 
 # are strings containing information regarding the trip or activity.
 #
+# Files written by later versions of the tracking app contain nineteen columns instead, with the ground truth
+# from the nineteenth column onwards, and some files of the earlier version leave the eleventh column empty,
+# with the ground truth from the twelfth column onwards. The ground truth is still read from the eleventh to
+# fourteenth columns for these files, so that none of their points are counted as correctly inferred.
+#
 # Finally, the rows in the file should be ordered in terms of increasing time. 
+#
+# The files are processed by numWorkers worker processes, and the results are reported and summed in order of
+# file name, so that the output does not depend on the number of workers. Each file is processed by the function
+# evaluate, i.e. evaluateFile or evaluateFileClustering.
 
-def tripActivitySeparator(dirPath):
+def tripActivitySeparator(dirPath, numWorkers = 1, evaluate = evaluateFile):
 
-    dataFiles = [ f for f in listdir(dirPath) if isfile(join(dirPath,f)) ]
+    dataFiles = sorted([ f for f in listdir(dirPath) if isfile(join(dirPath,f)) ])
+    results = parallel.mapTasks(evaluate, [dirPath + dataFile for dataFile in dataFiles], numWorkers)
     
-    minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
-    minSeparationDistance, minSeparationTime = 100, 360000
     timeTotTrips, timeInfTrips, distTotTrips, distInfTrips = 0, 0, 0, 0
-    for dataFile in dataFiles:
-        gpsTraces = []
-        filePath = dirPath + dataFile
-        try:
-            parseCSV(filePath, gpsTraces)
-            trips, activities, holes = inferTripActivity(gpsTraces, minDuration, maxRadius, minSeparationDistance, 
-                    minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
-            print dataFile, trips, activities, holes 
-            timeTotal, timeInferred, distTotal, distInferred = calInfAccuray(trips, activities, gpsTraces)
-            timeTotTrips += timeTotal
-            timeInfTrips += timeInferred
-            distTotTrips += distTotal
-            distInfTrips += distInferred
-        except:
-            print "Unexpected error:", sys.exc_info()[0]
-            pass
+    for dataFile, (result, error) in zip(dataFiles, results):
+        if error is not None:
+            print "Unexpected error in " + dataFile + ":"
+            print error
+            continue
+        (trips, activities, holes), (timeTotal, timeInferred, distTotal, distInferred) = result
+        print dataFile, trips, activities, holes 
+        timeTotTrips += timeTotal
+        timeInfTrips += timeInferred
+        distTotTrips += distTotal
+        distInfTrips += distInferred
     
     print 'Accuracy in terms of time: ' + str(round((timeInfTrips*100)/timeTotTrips, 2)) + '%'
     print 'Accuracy in terms of distance: ' + str(round((distInfTrips*100)/distTotTrips, 2)) + '%'
@@ -271,6 +119,13 @@ if __name__ == "__main__":
     # Folder within the repository containing the data files
     dirPath += 'Travel-Diary/Data/Temp/'
     
+    # Number of worker processes used to process the data files, change as appropriate
+    numWorkers = multiprocessing.cpu_count()
+    
+    # Algorithm used to separate trips and activities, either evaluateFile, or evaluateFileClustering for the 
+    # DBSCAN-based clustering ported from the MATLAB prototype, change as appropriate
+    evaluate = evaluateFile
+    
     # Call to function
-    tripActivitySeparator(dirPath)
+    tripActivitySeparator(dirPath, numWorkers, evaluate)
 
@@ -1,54 +1,42 @@
 from pymongo import MongoClient
-import dateutil.parser
 import numpy as np
-import datetime
+import sys
+from os.path import abspath, dirname, join
 from sklearn import tree
 from sklearn.externals.six import StringIO
 import pydot
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import modelRegistry, timeBuckets
+from travelDiary.neighborhoods import ActivityNeighborhoods
 
 
-def getTimeofDay(segment):
-    
-    frequency = np.zeros((8))    
-    startTime = dateutil.parser.parse(segment['startTime'])
-    endTime = dateutil.parser.parse(segment['endTime'])
-    while startTime < endTime:
-        frequency[startTime.hour/3] += 1
-        startTime = startTime + datetime.timedelta(0, 0, 0, 0, 0, 3, 0)    
-    return frequency
-
-
-def getDayOfWeek(segment):
-
-    frequency = np.zeros((3))    
-    weekDays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'] 
-    weekEnds = ['Saturday', 'Sunday']    
-    startTime = dateutil.parser.parse(segment['startTime'])
-    endTime = dateutil.parser.parse(segment['endTime'])
-    while startTime < endTime:
-        currentDay = startTime.strftime('%A')
-        if currentDay in weekDays:
-            frequency[0] += 1
-        elif currentDay in weekEnds:
-            frequency[1] += 1
-        if currentDay == 'Friday':
-            frequency[2] += 1
-        startTime = startTime + datetime.timedelta(1)
-    return frequency
-        
+# Radius in meters of the neighborhood of an activity, which is registered with the decision tree
+
+neighborhoodRadius = 100
+
+# Names of the features returned by getActivityFeatures
+
+purposeFeatureNames = ['timeOfDay' + str(3 * i) for i in range(0, 8)] + ['weekDays', 'weekEnds', 'fridays', 
+        'duration', 'durationInNeighborhood']
+
+# Name under which the decision tree is registered
+
+modelName = 'purposeDecisionTree'
+
 
-def getDurationInNeighborhood(activity):
+# Function that takes as input the MongoDB collection of segments, a phone number and a list of activities of
+# that phone, and returns for each activity the total duration of the segments of the phone whose centroid lies
+# within neighborhoodRadius meters of its centroid, which a $nearSphere query on the collection would return.
+# The centroids of the phone are read with one query and indexed in memory, and all activities are answered
+# from the index at once.
+
+def getDurationsInNeighborhood(segments, phNum, activities):
     
-    nearbyDuration = 0
-    centroid = activity['centroid']['coordinates']
-    query = {'centroid': {'$nearSphere': {'$geometry': {'type': 'Point',
-                                                        'coordinates': [centroid[0], centroid[1]]},
-                                          '$maxDistance': 100}},
-             'phNum': activity['phNum']}
-    nearbyActivities = segments.find(query)
-    for nearbyActivity in nearbyActivities:
-        nearbyDuration += nearbyActivity['duration']    
-    return nearbyDuration
+    query = {'phNum': phNum, 'centroid': {'$exists': True}}
+    projection = {'_id': 0, 'centroid': 1, 'duration': 1}
+    neighborhoods = ActivityNeighborhoods.fromActivities(segments.find(query, projection))
+    centroids = [activity['centroid']['coordinates'] for activity in activities]
+    return neighborhoods.calDurations(centroids, neighborhoodRadius)
 
 
 def getTotalDuration(activities):
@@ -59,6 +47,24 @@ def getTotalDuration(activities):
     return duration        
 
 
+# Function that takes as input a list of activities of a phone, the total duration of the activities of the
+# phone and the total duration of the segments in the neighborhood of each activity, and returns the matrix of
+# their features, with one row per activity, in the order of purposeFeatureNames. The start and end times are
+# parsed once, and the numbers of three-hour steps from the start to the end of each activity that fall in each
+# period of the day, and of one-day steps that fall on week days, weekend days and Fridays, are counted for all
+# activities at once.
+
+def getActivityFeatures(activities, totalDuration, nearbyDurations):
+
+    startTimes = timeBuckets.parseTimes([activity['startTime'] for activity in activities])
+    endTimes = timeBuckets.parseTimes([activity['endTime'] for activity in activities])
+    timeOfDay = timeBuckets.calTimeOfDay(startTimes, endTimes)
+    dayOfWeek = timeBuckets.calDayOfWeek(startTimes, endTimes)
+    durations = np.array([[activity['duration'], (100 * nearbyDuration) / totalDuration] 
+            for activity, nearbyDuration in zip(activities, nearbyDurations)], dtype = np.float64).reshape(-1, 2)
+    return np.column_stack((timeOfDay, dayOfWeek, durations))
+
+
 def calFeatures(segments, phNums):
     
     numActivities = segments.find({'type': 'Activity', 'mainPurpose': {'$exists': True}}).count()
@@ -71,23 +77,34 @@ def calFeatures(segments, phNums):
         projection = {'_id': 0, 'trackPoints': 0}
         activities = list(segments.find(query, projection))
         totalDuration = getTotalDuration(activities)
-        for activity in activities:            
-             
-            timeOfDay = getTimeofDay(activity)
-            dayOfWeek = getDayOfWeek(activity)
-            durationActivity = activity['duration']
-            durationInNeighborhood = (100 * getDurationInNeighborhood(activity)) / totalDuration
-
-            features[count, :timeOfDay.shape[0]] = timeOfDay
-            features[count, timeOfDay.shape[0]:timeOfDay.shape[0] + dayOfWeek.shape[0]] = dayOfWeek
-            features[count, -3] = durationActivity
-            features[count, -2] = durationInNeighborhood             
-            features[count, -1] = purposes.index(activity['mainPurpose']) + 1
-            count += 1
+        nearbyDurations = getDurationsInNeighborhood(segments, phNum, activities)
+        features[count:count + len(activities), :-1] = getActivityFeatures(activities, totalDuration, nearbyDurations)
+        features[count:count + len(activities), -1] = [purposes.index(activity['mainPurpose']) + 1 
+                for activity in activities]
+        count += len(activities)
     
     return features
 
 
+# Function that takes as input the MongoDB collection of segments, a list of phones and the RegisteredModel
+# of the decision tree, and infers the purpose of each activity of the phones, without any ground truth. Output
+# is a dictionary mapping each phone to a list of [startTime, endTime, purpose] lists.
+
+def inferPurposes(segments, phNums, model):
+
+    purposes = {}
+    for phNum in phNums:
+        query = {'type': 'Activity', 'phNum': phNum}
+        projection = {'_id': 0, 'trackPoints': 0}
+        activities = list(segments.find(query, projection))
+        totalDuration = getTotalDuration(activities)
+        nearbyDurations = getDurationsInNeighborhood(segments, phNum, activities)
+        features = getActivityFeatures(activities, totalDuration, nearbyDurations)
+        purposes[phNum] = [[activity['startTime'], activity['endTime'], purpose] 
+                for activity, purpose in zip(activities, model.predictNames(features))]
+    return purposes
+
+
 # Entry point to script
 
 if __name__ == "__main__":
@@ -98,19 +115,43 @@ if __name__ == "__main__":
     # Test phone numbers, change as appropriate    
     testPhones = [5107259365, 5107250774, 5107250619, 5107250786, 5107250740, 5107250744]
     
-    # Call to function
-    features = calFeatures(segments, testPhones)
-    featuresEstimation = features[:int(0.9 * np.size(features, 0)), :]
-    featuresValidation = features[int(0.9 * np.size(features, 0)):, :]
-
-    clf = tree.DecisionTreeClassifier(max_depth = 10, min_samples_leaf = 5)
-    clf = clf.fit(featuresEstimation[:, :-1], featuresEstimation[:, -1])
-    infAccuracy = (100.0 * sum(clf.predict(featuresValidation[:, :-1]) == featuresValidation[:, -1])) / np.size(featuresValidation, 0)
-    print 'Inference accuracy: %.2f%%' % infAccuracy
+    # Phones whose activities are labelled by the decision tree, change as appropriate
+    newPhones = []
+    
+    # The decision tree is trained on the data of the test phones and registered on the first run. Later runs
+    # load the registered tree instead, unless retrain is set to True, e.g. after recording more ground truth
+    retrain = False
     
-    dot_data = StringIO() 
-    tree.export_graphviz(clf, out_file=dot_data) 
-    graph = pydot.graph_from_dot_data(dot_data.getvalue()) 
-    outputPath = '/Users/vij/Work/Current Research/Travel-Diary/Documentation/Activity Inference/' 
-    graph.write_pdf(outputPath + "purposeDecisionTree01.pdf") 
+    if retrain or not modelRegistry.hasModel(modelName):
+    
+        # Call to function
+        features = calFeatures(segments, testPhones)
+        featuresEstimation = features[:int(0.9 * np.size(features, 0)), :]
+        featuresValidation = features[int(0.9 * np.size(features, 0)):, :]
+    
+        clf = tree.DecisionTreeClassifier(max_depth = 10, min_samples_leaf = 5)
+        clf = clf.fit(featuresEstimation[:, :-1], featuresEstimation[:, -1])
+        infAccuracy = (100.0 * sum(clf.predict(featuresValidation[:, :-1]) == featuresValidation[:, -1])) / np.size(featuresValidation, 0)
+        print 'Inference accuracy: %.2f%%' % infAccuracy
+        
+        purposeNames = dict((i + 1, purpose) for i, purpose in enumerate(segments.distinct('mainPurpose')))
+        model = modelRegistry.saveModel(modelName, clf, purposeFeatureNames, purposeNames, 
+                {'neighborhoodRadius': neighborhoodRadius}, featuresEstimation)
+        
+        dot_data = StringIO() 
+        tree.export_graphviz(clf, out_file=dot_data) 
+        graph = pydot.graph_from_dot_data(dot_data.getvalue()) 
+        outputPath = '/Users/vij/Work/Current Research/Travel-Diary/Documentation/Activity Inference/' 
+        graph.write_pdf(outputPath + "purposeDecisionTree01.pdf") 
+    
+    else:
+        model = modelRegistry.loadModel(modelName)
+        model.checkParameters({'neighborhoodRadius': neighborhoodRadius})
+        print 'Loaded decision tree trained on %d activities (%s)' % (model.numSamples, model.fingerprint)
+    
+    # Call to function
+    purposes = inferPurposes(segments, newPhones, model)
+    for phNum in newPhones:
+        for startTime, endTime, purpose in purposes[phNum]:
+            print phNum, startTime, endTime, purpose
     
@@ -2,38 +2,85 @@ import numpy
 import sys
 import tripActivitySeparatorMongo
 import modeChainSeparatorMongo
+from os.path import abspath, dirname, join
 from pymongo import MongoClient
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import modelRegistry, mongoLoader
+from travelDiary.pointFeatures import PointFeatures
+from travelDiary.traces import asGpsTrace
 from sklearn import tree
 from sklearn.externals.six import StringIO
 import pydot
 
 
-def determineFeatures(modeChain, gpsTraces, hcrThreshold, srThreshold, vcrTheshold, minSamplingRate):
+# Parameters used to separate trips into mode chains and to calculate the features of the mode chains, which
+# are registered with the decision tree, as it only applies to features calculated with the same values
+
+minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
+minSeparationDistance, minSeparationTime = 100, 360000
+maxWalkSpeed, maxWalkAcceleration, minSegmentDuration, minSegmentLength = 5, 1620, 90000, 200
+hcrThreshold, srThreshold, vcrTheshold = 19, 7.6, 0.26
+
+modeParameters = {'minDuration': minDuration, 'maxRadius': maxRadius, 'minSamplingRate': minSamplingRate, 
+        'gpsAccuracyThreshold': gpsAccuracyThreshold, 'minSeparationDistance': minSeparationDistance, 
+        'minSeparationTime': minSeparationTime, 'maxWalkSpeed': maxWalkSpeed, 
+        'maxWalkAcceleration': maxWalkAcceleration, 'minSegmentDuration': minSegmentDuration, 
+        'minSegmentLength': minSegmentLength, 'hcrThreshold': hcrThreshold, 'srThreshold': srThreshold, 
+        'vcrTheshold': vcrTheshold}
+
+# Names of the features returned by determineFeatures, and of the modes labelled by determineModes
+
+modeFeatureNames = ['distance', 'headingChangeRate', 'stopRate', 'velocityChangeRate', 'averageSpeed', 
+        'expectedSpeed', 'varianceSpeed', 'maxSpeed1', 'maxSpeed2', 'maxSpeed3', 'maxAcceleration1', 
+        'maxAcceleration2', 'maxAcceleration3']
+modeNames = {1: 'Walk', 2: 'Bike', 3: 'Car', 4: 'Transit'}
+
+# Name under which the decision tree is registered
+
+modelName = 'modeDecisionTree'
+
+
+# Function that takes as input the list of documents holding the GPS points of a phone, ordered in terms of
+# increasing time, or the corresponding GpsTrace, and returns the PointFeatures of all its points, computed
+# once with array operations from the derived columns of the trace. The relative change in speed of the points
+# followed by a sampling interval shorter than minSamplingRate milliseconds, and NaN for the others, is added
+# as the feature sampledSpeedChange.
+
+def calPointFeatures(gpsTraces, minSamplingRate):
     
-    numPoints = modeChain[1] - modeChain[0]
-    distance, time, hcr, sr, vcr, counter = 0, 0, 0, 0, 0, 0
-    speed, acceleration = numpy.zeros(shape = (numPoints,1)), numpy.zeros(shape = (numPoints,1))    
-    for i in range(modeChain[0], modeChain[1]):
-        distance += modeChainSeparatorMongo.lengthPoint(gpsTraces, i)
-        time += modeChainSeparatorMongo.timePoint(gpsTraces, i)
-        hcr += int(modeChainSeparatorMongo.headingChangePoint(gpsTraces, i) > hcrThreshold)  
-        speed[counter, 0] = modeChainSeparatorMongo.speedPoint(gpsTraces, i)
-        sr += int(speed[counter, 0] < srThreshold)
-        acceleration[counter, 0] = modeChainSeparatorMongo.accelerationPoint(gpsTraces, i)
-        if gpsTraces[i+1]['epochTime'] - gpsTraces[i]['epochTime'] < minSamplingRate:
-            vcr += int((abs(modeChainSeparatorMongo.speedPoint(gpsTraces, i + 1) - 
-                    speed[counter, 0]) / speed[counter, 0]) > vcrTheshold)
-        counter += 1
+    gpsTraces = asGpsTrace(gpsTraces)
+    features = PointFeatures.fromTrace(gpsTraces)
+    isSampled = numpy.diff(gpsTraces.epochTime)[:len(features)] < minSamplingRate
+    features.sampledSpeedChange = numpy.where(isSampled, features.speedChange, numpy.nan)
+    return features
+
+
+# Function that takes as input a mode chain and the PointFeatures returned by calPointFeatures, and returns the
+# features of the mode chain, in the order of modeFeatureNames: its length, the numbers of points per meter
+# whose heading change exceeds hcrThreshold, whose speed is below srThreshold, and whose relative change in
+# speed exceeds vcrThreshold, its average speed, the mean and variance of the speeds of its points, and the
+# three highest speeds and accelerations. The sums, counts and highest values are read from the
+# SegmentAggregates of the features, in time independent of the length of the mode chain. Raises the errors
+# the per-point functions would raise for the mode chain.
+
+def determineFeatures(modeChain, features, hcrThreshold, srThreshold, vcrTheshold):
+    
+    start, end = modeChain[0], modeChain[1]
+    features.checkRange(start, end)
+    speed, acceleration = features.aggregates('speed'), features.aggregates('acceleration')
+    distance = features.aggregates('distance').sum(start, end)
+    time = features.aggregates('time').sum(start, end)
+    hcr = features.aggregates('headingChange').countAbove(hcrThreshold, start, end)
+    sr = speed.countBelow(srThreshold, start, end)
+    vcr = features.aggregates('sampledSpeedChange').countAbove(vcrTheshold, start, end)
     hcr /= distance
     sr /= distance
     vcr /= distance
     averageSpeed = distance/time
-    expectedSpeed = numpy.sum(speed, axis = 0) / numPoints
-    varianceSpeed = numpy.var(speed, axis = 0)   
-    speed, acceleration = numpy.sort(speed, axis = 0), numpy.sort(acceleration, axis = 0)
-    features = [distance, hcr, sr, vcr, averageSpeed, expectedSpeed[0], varianceSpeed[0]]
-    features.extend((speed[-1, 0], speed[-2, 0], speed[-3, 0]))
-    features.extend((acceleration[-1, 0], acceleration[-2, 0], acceleration[-3, 0]))
+    topSpeeds, topAccelerations = speed.topK(start, end), acceleration.topK(start, end)
+    features = [distance, hcr, sr, vcr, averageSpeed, speed.mean(start, end), speed.variance(start, end)]
+    features.extend((topSpeeds[0], topSpeeds[1], topSpeeds[2]))
+    features.extend((topAccelerations[0], topAccelerations[1], topAccelerations[2]))
     return features
 
 
@@ -51,26 +98,26 @@ def convertListToArray(inputLists):
     return outputArray
 
 
-# Procedure that takes as input the GPS data, and the inferred mode chain for trips, and calculates the 
-# features for the mode chain and attaches the ground truth mode label
+# Procedure that takes as input the GpsTrace of a phone, and the inferred mode chain for trips, and calculates
+# the features for the mode chain and attaches the ground truth mode label
 
-def determineModes(modeChains, modeData, gpsTraces, hcrThreshold, srThreshold, vcrTheshold, minSamplingRate):
+def determineModes(modeChains, modeData, gpsTraces, pointFeatures, hcrThreshold, srThreshold, vcrTheshold):
     
     for modeChain in modeChains:
         
         try:
             if modeChain[1] - modeChain[0] >= 3:
-                features = determineFeatures(modeChain, gpsTraces, hcrThreshold, srThreshold, vcrTheshold, minSamplingRate)
+                features = determineFeatures(modeChain, pointFeatures, hcrThreshold, srThreshold, vcrTheshold)
                 
                 walk, bike, car, transit, other = 0, 0, 0, 0, 0
                 for i in range(modeChain[0], modeChain[1]):
-                    if gpsTraces[i]['groundTruth']['label'] == 'Trip' and gpsTraces[i]['groundTruth']['mode'] == 'Walk':
+                    if gpsTraces.label('label', i) == 'Trip' and gpsTraces.label('mode', i) == 'Walk':
                         walk += 1
-                    elif gpsTraces[i]['groundTruth']['label'] == 'Trip' and gpsTraces[i]['groundTruth']['mode'] == 'Bike':
+                    elif gpsTraces.label('label', i) == 'Trip' and gpsTraces.label('mode', i) == 'Bike':
                         bike += 1
-                    elif gpsTraces[i]['groundTruth']['label'] == 'Trip' and gpsTraces[i]['groundTruth']['mode'] == 'Car':
+                    elif gpsTraces.label('label', i) == 'Trip' and gpsTraces.label('mode', i) == 'Car':
                         car += 1
-                    elif gpsTraces[i]['groundTruth']['label'] == 'Trip' and gpsTraces[i]['groundTruth']['mode'] == 'Transit':
+                    elif gpsTraces.label('label', i) == 'Trip' and gpsTraces.label('mode', i) == 'Transit':
                         transit += 1
                     else:
                         other += 1
@@ -93,6 +140,22 @@ def determineModes(modeChains, modeData, gpsTraces, hcrThreshold, srThreshold, v
             pass
 
 
+# Function that takes as input the list of documents holding the GPS points of a phone, ordered in terms of
+# increasing time, or the corresponding GpsTrace, and returns the list of its trips
+
+def inferTrips(gpsTraces):
+    trips, activities, holes = tripActivitySeparatorMongo.inferTripActivity(gpsTraces, minDuration, 
+            maxRadius, minSeparationDistance, minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
+    return trips
+
+
+# Function that takes as input the same GPS data and a trip, and returns the list of the mode chains of the trip
+
+def inferModeChains(gpsTraces, trip):
+    return modeChainSeparatorMongo.inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration, 
+            minSegmentDuration, minSegmentLength, gpsAccuracyThreshold)
+
+
 # Procedure that takes as input a MongoDB collection of location data and a list of test phones,
 # separates the GPS points into trip segments, and constructs a dictionary of segments, and their 
 # features, corresponding to each of the four travel modes.
@@ -102,34 +165,68 @@ def constructDT(gpsPoints, testPhones):
     reload(tripActivitySeparatorMongo)
     reload(modeChainSeparatorMongo)
 
-    minDuration, maxRadius, minSamplingRate, gpsAccuracyThreshold = 360000, 50, 300000, 200
-    minSeparationDistance, minSeparationTime = 100, 360000
-    maxWalkSpeed, maxWalkAcceleration, minSegmentDuration, minSegmentLength = 5, 1620, 90000, 200
-    hcrThreshold, srThreshold, vcrTheshold = 19, 7.6, 0.26
-    
     modeData = []
 
     for testPhone in testPhones:
         
         print 'Processing data for ' + str(testPhone)
         try:
-            query = {'phNum': testPhone}
-            projection = {'_id': 0, 'gpsReading': 1, 'epochTime': 1, 'groundTruth': 1, 'movesTime': 1}
-            gpsTraces = list(gpsPoints.find(query, projection).sort('epochTime'))
-    
-            trips, activities, holes = tripActivitySeparatorMongo.inferTripActivity(gpsTraces, minDuration, 
-                    maxRadius, minSeparationDistance, minSeparationTime, minSamplingRate, gpsAccuracyThreshold)
-            
+            gpsTrace = mongoLoader.loadGpsTrace(gpsPoints, testPhone)
+            trips = inferTrips(gpsTrace)
+            pointFeatures = calPointFeatures(gpsTrace, minSamplingRate)
             for trip in trips:
-                modeChains = modeChainSeparatorMongo.inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration, 
-                        minSegmentDuration, minSegmentLength, gpsAccuracyThreshold)
-                determineModes(modeChains, modeData, gpsTraces, hcrThreshold, srThreshold, vcrTheshold, minSamplingRate)
+                modeChains = inferModeChains(gpsTrace, trip)
+                determineModes(modeChains, modeData, gpsTrace, pointFeatures, hcrThreshold, srThreshold, 
+                        vcrTheshold)
         except:
             print "Unexpected error during inference:", sys.exc_info()[0]
             pass
 
     return modeData
-        
+
+
+# Function that takes as input the GpsTrace of a phone, or the list of documents holding its GPS points, ordered
+# in terms of increasing time, and the RegisteredModel of the decision tree, and infers the mode of each mode
+# chain of the phone that has at least three points, without any ground truth. The features of the mode chains
+# are built into one matrix, from point features computed once for the phone, and classified with a single
+# call to predict. Trips that cannot be separated into mode chains, and mode chains whose features cannot be
+# calculated, e.g. because they include a zero time interval, are left out. Output is a list of
+# [start, end, mode] lists, where start and end are the indices of the first and last point of a mode chain.
+
+def inferModes(gpsTraces, model):
+
+    gpsTraces = asGpsTrace(gpsTraces)
+    trips = inferTrips(gpsTraces)
+    pointFeatures = calPointFeatures(gpsTraces, minSamplingRate)
+    
+    labeledChains, features = [], []
+    for trip in trips:
+        try:
+            modeChains = inferModeChains(gpsTraces, trip)
+        except (IndexError, ZeroDivisionError):
+            continue
+        for modeChain in modeChains:
+            try:
+                if modeChain[1] - modeChain[0] >= 3:
+                    features.append(determineFeatures(modeChain, pointFeatures, hcrThreshold, srThreshold, 
+                            vcrTheshold))
+                    labeledChains.append(modeChain)
+            except (IndexError, ZeroDivisionError):
+                pass
+    
+    return [[modeChain[0], modeChain[1], mode] for modeChain, mode in zip(labeledChains, model.predictNames(features))]
+
+
+# Function that takes as input a MongoDB collection of location data, a phone number and the RegisteredModel of
+# the decision tree, and returns the modes inferred by inferModes for the GPS points of the phone, as a list
+# of [start, end, mode] lists, where start and end are the epoch times of the first and last point of a mode
+# chain.
+
+def inferPhoneModes(gpsPoints, phone, model):
+    gpsTrace = mongoLoader.loadGpsTrace(gpsPoints, phone)
+    return [[gpsTrace.epochTime[start], gpsTrace.epochTime[end], mode] 
+            for start, end, mode in inferModes(gpsTrace, model)]
+
 
 # Entry point to script
 
@@ -143,20 +240,47 @@ if __name__ == "__main__":
     # Test phone numbers, change as appropriate    
     testPhones = [5107259365, 5107250774, 5107250619, 5107250786, 5107250740, 5107250744]
     
-    # Call to function
-    modeData = constructDT(gpsPoints, testPhones)    
+    # Phones whose mode chains are labelled by the decision tree, change as appropriate
+    newPhones = []
     
-    modeData = convertListToArray(modeData)
-    modeDataEstimation = modeData[:int(0.9 * numpy.size(modeData, 0)), :]
-    modeDataValidation = modeData[int(0.9 * numpy.size(modeData, 0)):, :]
-
-    clf = tree.DecisionTreeClassifier(max_depth = 10, min_samples_leaf = 5)
-    clf = clf.fit(modeDataEstimation[:, :-1], modeDataEstimation[:, -1])
-    infAccuracy = (100.0 * sum(clf.predict(modeDataValidation[:, :-1]) == modeDataValidation[:, -1])) / numpy.size(modeDataValidation, 0)
-    print 'Inference accuracy: %.2f%%' % infAccuracy
+    # The decision tree is trained on the data of the test phones and registered on the first run. Later runs
+    # load the registered tree instead, unless retrain is set to True, e.g. after recording more ground truth
+    retrain = False
     
-    dot_data = StringIO() 
-    tree.export_graphviz(clf, out_file=dot_data) 
-    graph = pydot.graph_from_dot_data(dot_data.getvalue()) 
-    outputPath = '/Users/vij/Work/Current Research/Travel-Diary/Documentation/Mode Inference/' 
-    graph.write_pdf(outputPath + "modeDecisionTree.pdf") 
+    if retrain or not modelRegistry.hasModel(modelName):
+    
+        # Call to function
+        modeData = constructDT(gpsPoints, testPhones)    
+        
+        modeData = convertListToArray(modeData)
+        modeDataEstimation = modeData[:int(0.9 * numpy.size(modeData, 0)), :]
+        modeDataValidation = modeData[int(0.9 * numpy.size(modeData, 0)):, :]
+    
+        clf = tree.DecisionTreeClassifier(max_depth = 10, min_samples_leaf = 5)
+        clf = clf.fit(modeDataEstimation[:, :-1], modeDataEstimation[:, -1])
+        infAccuracy = (100.0 * sum(clf.predict(modeDataValidation[:, :-1]) == modeDataValidation[:, -1])) / numpy.size(modeDataValidation, 0)
+        print 'Inference accuracy: %.2f%%' % infAccuracy
+        
+        model = modelRegistry.saveModel(modelName, clf, modeFeatureNames, modeNames, modeParameters, 
+                modeDataEstimation)
+        
+        dot_data = StringIO() 
+        tree.export_graphviz(clf, out_file=dot_data) 
+        graph = pydot.graph_from_dot_data(dot_data.getvalue()) 
+        outputPath = '/Users/vij/Work/Current Research/Travel-Diary/Documentation/Mode Inference/' 
+        graph.write_pdf(outputPath + "modeDecisionTree.pdf")
+    
+    else:
+        model = modelRegistry.loadModel(modelName)
+        model.checkParameters(modeParameters)
+        print 'Loaded decision tree trained on %d mode chains (%s)' % (model.numSamples, model.fingerprint)
+    
+    # Call to function
+    for phone in newPhones:
+        print 'Processing data for ' + str(phone)
+        try:
+            for start, end, mode in inferPhoneModes(gpsPoints, phone, model):
+                print phone, start, end, mode
+        except:
+            print "Unexpected error during inference:", sys.exc_info()[0]
+            pass 
@@ -2,10 +2,16 @@ from pymongo import MongoClient
 from dateutil import parser
 import re
 import glob
+import sys
+from os.path import abspath, dirname, join
+sys.path.append(join(dirname(abspath(__file__)), '..'))
+from travelDiary import indexes
 
 client = MongoClient()
 db = client.travel_diary_db
 obs = db.observations
+for keys, message in indexes.ensureIndexes(obs, indexes.observationIndexes):
+  print "Could not create index %s: %s"%(keys, message)
 
 for l in glob.glob('../../Data/Google Play API/*.csv'):
   print l
@@ -0,0 +1,2 @@
+# Shared inference kernels for the Travel Diary scripts. Scripts in the sibling folders add the
+# Code directory to sys.path and import the modules they need, e.g. 'from travelDiary import geodesy'.
@@ -0,0 +1,31 @@
+import numpy
+
+
+# Function that takes as input a list of events, where an event is a list [start, end, ...] of point indices,
+# and the number of points, and returns a boolean array that is True for every point i such that
+# start <= i < end for some event, i.e. for the points counted as part of the events when scoring an inference
+
+def intervalMask(events, numPoints):
+    mask = numpy.zeros(numPoints, dtype = bool)
+    for event in events:
+        if event[1] > event[0]:
+            mask[event[0]:event[1]] = True
+    return mask
+
+
+# Function that takes as input a list of events and a boolean array over the points, and returns an array
+# containing, for each event, the number of points i with start <= i < end for which the array is True
+
+def countInIntervals(events, isValue):
+    counts = numpy.concatenate(([0], numpy.cumsum(isValue)))
+    return numpy.array([counts[max(event[1], event[0])] - counts[event[0]] for event in events], dtype = numpy.int64)
+
+
+# Function that takes as input an array of values and a boolean array of the same length, and returns the sum of
+# the values for which the array is True. The values are added one at a time in order, exactly as a loop over
+# the points would, so that the result is identical to that of the loop and not just equal up to round-off.
+
+def maskedSum(values, mask):
+    if values.shape[0] == 0:
+        return 0
+    return numpy.cumsum(numpy.where(mask, values, 0.0))[-1]
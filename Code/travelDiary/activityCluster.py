@@ -0,0 +1,99 @@
+import numpy
+from travelDiary import geodesy
+
+
+# Margin in meters applied to the bounds below, so that round-off in the haversine computations can never
+# make a bound decide a comparison that the exact test would decide differently
+
+boundTolerance = 1e-6
+
+
+# Class that represents the collection of successive GPS points grown by inferTripActivity while looking for an
+# activity, i.e. the points start, start + 1, ..., end - 1 of an array of points, where a point is a row containing
+# its latitude, longitude and GPS accuracy.
+#
+# The method fits answers whether a candidate point lies within maxRadius meters of the cluster, using the same
+# definition as the calDistanceToPoint functions in the inference scripts: the maximum distance from the 95% CI
+# around the candidate to the 95% CI around any point in the cluster must be less than maxRadius. Instead of
+# computing the distance to every point in the cluster, the cluster keeps its first point as an anchor, along
+# with the running maximum over its points of (distance to the anchor - GPS accuracy). By the triangle
+# inequality, for any point p in the cluster,
+#
+#   distance(candidate, p) - accuracy(candidate) - accuracy(p)
+#       <= distance(candidate, anchor) - accuracy(candidate) + max(distance(anchor, p) - accuracy(p)),
+#
+# and the anchor itself is one of the points in the cluster, which gives a lower bound. Most candidates are
+# accepted or rejected by one of these two bounds in constant time. Only when the exact value falls between
+# the bounds is the candidate compared against every point in the cluster, so the results are identical to
+# those of the exhaustive comparison.
+#
+# If a LocalProjection of the points is given, distances are computed as planar distances instead of with the
+# haversine formula, and widened by their error bound, so that every comparison they decide is decided as the
+# haversine distances would. Comparisons within the error bound of maxRadius fall back to the haversine formula.
+
+class ActivityCluster(object):
+
+    def __init__(self, points, start, maxRadius, projection = None):
+        self.points, self.projection = points, projection
+        self.start, self.end = start, start + 1
+        self.maxRadius = maxRadius
+        self.anchor = (points[start, 0], points[start, 1])
+        self.anchorAccuracy = points[start, 2]
+        self.maxSpread = -self.anchorAccuracy
+
+    def __len__(self):
+        return self.end - self.start
+
+    # Function that takes as input the index of a point, and returns lower and upper bounds on the distance, in
+    # meters, between the anchor and the point
+
+    def boundAnchorDistance(self, k):
+        if self.projection is not None:
+            distance = self.projection.distance(self.start, k)
+            error = self.projection.errorBound(distance)
+            if error < float('inf'):
+                return distance - error, distance + error
+        distance = geodesy.calDistance(self.anchor, (self.points[k, 0], self.points[k, 1]))
+        return distance, distance
+
+    # Function that outputs the maximum distance, in meters, from the 95% CI around point k to the 95% CI
+    # around any point in the cluster
+
+    def distanceToPoint(self, k):
+        point, points = self.points[k], self.points[self.start:self.end]
+        dist = geodesy.calDistances(point[0], point[1], points[:, 0], points[:, 1]) - point[2] - points[:, 2]
+        return max(0, numpy.max(dist))
+
+    # Function that returns True if the maximum distance from the 95% CI around point k to the 95% CI around any
+    # point in the cluster is less than maxRadius, deciding with the planar distances when they are further from
+    # maxRadius than their error bound
+
+    def isNear(self, k):
+        if self.projection is not None:
+            distances = self.projection.distances(k, slice(self.start, self.end))
+            errors = self.projection.errorBounds(distances)
+            margins = -self.points[k, 2] - self.points[self.start:self.end, 2]
+            if max(0, numpy.max(distances + errors + margins)) < self.maxRadius:
+                return True
+            if max(0, numpy.max(distances - errors + margins)) >= self.maxRadius:
+                return False
+        return self.distanceToPoint(k) < self.maxRadius
+
+    # Function that returns True if point k lies within maxRadius meters of the cluster
+
+    def fits(self, k):
+        lower, upper = self.boundAnchorDistance(k)
+        if lower - self.points[k, 2] - self.anchorAccuracy >= self.maxRadius + boundTolerance:
+            return False
+        if upper - self.points[k, 2] + self.maxSpread < self.maxRadius - boundTolerance and self.maxRadius > 0:
+            return True
+        return self.isNear(k)
+
+    # Procedure that adds the next point, with index end, to the cluster
+
+    def add(self):
+        k = self.end
+        spread = self.boundAnchorDistance(k)[1] - self.points[k, 2]
+        if spread > self.maxSpread:
+            self.maxSpread = spread
+        self.end += 1
@@ -0,0 +1,119 @@
+import json
+import numpy
+import os
+import shutil
+from os.path import abspath, basename, dirname, getmtime, getsize, isdir, isfile, join
+from travelDiary import loader
+from travelDiary.gpsTrace import GpsTrace, LabelColumn
+
+
+# Version of the layout of the cached files, to be incremented whenever the layout or the parsing done by the
+# loader changes, so that stale caches are rebuilt
+
+cacheVersion = 2
+
+# Name of the directory, created next to the data files, in which the parsed traces are cached by default
+
+defaultCacheName = '.gpsTraceCache'
+
+# Names of the numeric columns stored as attributes of a GpsTrace
+
+traceColumns = ['epochTime', 'lat', 'lon', 'accuracy', 'battery', 'samplingRate']
+
+
+# Function that takes as input the path to a GPS data file and the cache directory, and returns the path to the
+# directory holding the cached columns of that file
+
+def getCachePath(filePath, cacheDir = None):
+    if cacheDir is None:
+        cacheDir = join(dirname(abspath(filePath)), defaultCacheName)
+    return join(cacheDir, basename(filePath))
+
+
+# Function that takes as input the path to a GPS data file, and returns the description of the file recorded
+# in the manifest of its cache, which must match for the cache to be reused
+
+def describeSource(filePath):
+    return {'source': abspath(filePath), 'size': getsize(filePath), 'mtime': getmtime(filePath),
+            'version': cacheVersion}
+
+
+# Procedure that takes as input a GpsTrace, the path to the GPS data file it was parsed from and the cache path,
+# and writes one .npy file per column along with the manifest. The cache is first written to a temporary
+# directory, so that a reader never sees a partially written cache.
+
+def writeCache(gpsTraces, filePath, cachePath):
+
+    tempPath = cachePath + '.' + str(os.getpid()) + '.tmp'
+    if isdir(tempPath):
+        shutil.rmtree(tempPath)
+    os.makedirs(tempPath)
+
+    for name in traceColumns:
+        numpy.save(join(tempPath, name + '.npy'), getattr(gpsTraces, name))
+    for name in gpsTraces.columns:
+        numpy.save(join(tempPath, 'column_' + name + '.npy'), gpsTraces.columns[name])
+    for name in gpsTraces.labels:
+        numpy.save(join(tempPath, 'label_' + name + '_codes.npy'), gpsTraces.labels[name].codes)
+        numpy.save(join(tempPath, 'label_' + name + '_categories.npy'),
+                numpy.array(gpsTraces.labels[name].categories, dtype = str))
+
+    manifest = describeSource(filePath)
+    manifest['columns'], manifest['labels'] = sorted(gpsTraces.columns), sorted(gpsTraces.labels)
+    with open(join(tempPath, 'manifest.json'), 'w') as manifestFile:
+        json.dump(manifest, manifestFile)
+
+    if isdir(cachePath):
+        shutil.rmtree(cachePath)
+    os.rename(tempPath, cachePath)
+
+
+# Function that takes as input the path to a GPS data file and its cache path, and returns the cached GpsTrace
+# with its numeric columns memory-mapped, or None if there is no cache or the file has changed since
+
+def readCache(filePath, cachePath):
+
+    manifestPath = join(cachePath, 'manifest.json')
+    if not isfile(manifestPath):
+        return None
+    with open(manifestPath, 'r') as manifestFile:
+        manifest = json.load(manifestFile)
+    source = describeSource(filePath)
+    if any(manifest.get(key) != source[key] for key in source):
+        return None
+
+    columns = [numpy.load(join(cachePath, name + '.npy'), mmap_mode = 'r') for name in traceColumns]
+    extraColumns = dict((name, numpy.load(join(cachePath, 'column_' + name + '.npy'), mmap_mode = 'r'))
+            for name in manifest['columns'])
+    labels = {}
+    for name in manifest['labels']:
+        categories = numpy.load(join(cachePath, 'label_' + name + '_categories.npy')).tolist()
+        codes = numpy.load(join(cachePath, 'label_' + name + '_codes.npy'), mmap_mode = 'r')
+        labels[name] = LabelColumn.fromCodes(categories, codes)
+
+    return GpsTrace(*columns, labels = labels, columns = extraColumns)
+
+
+# Function that takes as input the path to a GPS data file in either schema, and returns its contents as a
+# GpsTrace, like loader.loadGpsTrace. The parsed columns are cached in cacheDir, by default a directory named
+# defaultCacheName next to the data file, and reused as long as the size and modification time of the data
+# file are unchanged. A cache that cannot be written, e.g. on a read-only file system, is simply skipped.
+
+def loadGpsTrace(filePath, cacheDir = None):
+
+    cachePath = getCachePath(filePath, cacheDir)
+    try:
+        gpsTraces = readCache(filePath, cachePath)
+    except (IOError, OSError, ValueError, KeyError):
+        gpsTraces = None
+    if gpsTraces is not None:
+        return gpsTraces
+
+    gpsTraces = loader.loadGpsTrace(filePath)
+    try:
+        if not isdir(dirname(cachePath)):
+            os.makedirs(dirname(cachePath))
+        writeCache(gpsTraces, filePath, cachePath)
+    except (IOError, OSError):
+        pass
+    return gpsTraces
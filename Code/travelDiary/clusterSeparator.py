@@ -0,0 +1,150 @@
+import collections
+import math
+import numpy
+from travelDiary import samplingGaps
+from travelDiary.localProjection import LocalProjection
+from travelDiary.traces import asGpsTrace
+from travelDiary.tripActivity import separateEvents
+
+
+# Number of points within the neighborhood of a point, including the point itself, at or below which the point
+# is an outlier
+
+numThreshold = 2
+
+# Labels of the points returned by clusterPoints: the class of a point is tripClass, or the number of the
+# activity it belongs to, counting from 1, and its type tells whether it is a core point, a border point or an
+# outlier of that activity
+
+tripClass = -1
+coreType, borderType, outlierType = 1, 0, -1
+
+
+# Function that takes as input the points projected onto a plane, in meters, the index k of a point, the number
+# of points in its time window and the neighborhood radius eps, and returns the sorted array of the indices of
+# the points k, k + 1, ..., k + window within eps meters of point k, including the point itself. The window is
+# a contiguous slice of the points, so the distances to all its points are computed with one array operation.
+
+def findNeighbors(x, y, k, window, eps):
+    last = min(k + window, x.shape[0] - 1)
+    dx, dy = x[k:last + 1] - x[k], y[k:last + 1] - y[k]
+    return k + numpy.flatnonzero(numpy.sqrt(dx ** 2 + dy ** 2) <= eps)
+
+
+# Function that takes as input the points projected onto a plane and the minimum number of points of an
+# activity, and returns the neighborhood radius estimated by the prototype when none is given
+
+def estimateEps(x, y, minPoints):
+    area = (x.max() - x.min()) * (y.max() - y.min())
+    return math.sqrt(area * minPoints / (x.shape[0] * math.pi))
+
+
+# Function that takes as input the epoch times, latitudes and longitudes of a set of GPS points, in order of
+# increasing time, the minimum duration of an activity in milliseconds, and the neighborhood radius eps in
+# meters, and clusters the points into activities with the time-windowed DBSCAN algorithm of the MATLAB
+# prototype, Matlab_trip_act_dounan/act_trip_cluster_2.m. Output is a tuple containing the class and the type of
+# each point, as defined above. If eps is None, it is estimated from the spread of the points. Distances are
+# planar distances between the points projected with a LocalProjection, rather than with the fixed scale factors
+# of the prototype, which hold in central California only.
+#
+# The minimum number of points of an activity, and the time window of each point, i.e. the number of later
+# points it is compared with, follow from minDuration and the median interval between successive points. A
+# point with more than that many neighbors within eps meters in its window that are not yet in an activity
+# starts a new activity, which is grown by adding the neighbors of each of its points with more than
+# numThreshold neighbors. Points with numThreshold neighbors or fewer, and points not added to any activity,
+# are trip points.
+#
+# Each point is compared only with the points in its time window, so the running time grows linearly with the
+# number of points for a given window. The points waiting to be added to an activity are flagged in an array,
+# rather than searched for in the queue as in the prototype, whose running time grew with the square of the
+# number of points of an activity.
+
+def clusterPoints(epochTime, lat, lon, minDuration, eps = None):
+
+    numPoints = len(epochTime)
+    classes = numpy.zeros(numPoints, dtype = numpy.int64)
+    types = numpy.zeros(numPoints, dtype = numpy.int64)
+    interval = numpy.median(numpy.diff(epochTime)) if numPoints > 1 else 0
+    if interval <= 0:
+        classes[:], types[:] = tripClass, outlierType
+        return classes, types
+
+    minPoints = int(round(float(minDuration) / interval))
+    window = int(round(float(minDuration) / interval * 2))
+    projection = LocalProjection(lat, lon)
+    x, y = projection.x, projection.y
+    if eps is None:
+        eps = estimateEps(x, y, minPoints)
+
+    touched = numpy.zeros(numPoints, dtype = bool)
+    queued = numpy.zeros(numPoints, dtype = bool)
+    activity = 1
+    for i in range(0, numPoints):
+        if touched[i]:
+            continue
+
+        # Label the point an outlier, a border point or the first core point of a new activity
+        ind = findNeighbors(x, y, i, window, eps)
+        ind = ind[~touched[ind]]
+        if ind.shape[0] <= numThreshold:
+            classes[i], types[i], touched[i] = tripClass, outlierType, True
+            continue
+        if ind.shape[0] < minPoints + 1:
+            classes[i], types[i] = 0, borderType
+            continue
+        types[i], classes[ind] = coreType, activity
+
+        # Grow the activity from the neighbors of the point, in the order in which they are reached
+        queue = collections.deque(ind)
+        queued[ind] = True
+        while queue:
+            k = queue.popleft()
+            queued[k], touched[k] = False, True
+            nearby = findNeighbors(x, y, k, window, eps)
+            if nearby.shape[0] > numThreshold:
+                classes[nearby] = activity
+                types[k] = coreType if nearby.shape[0] >= minPoints + 1 else borderType
+                for point in nearby[~touched[nearby]]:
+                    touched[point] = True
+                    if not queued[point]:
+                        queue.append(point)
+                        queued[point] = True
+        activity += 1
+
+    # Border points that were not reached from any activity are trip points
+    isBorder = classes == 0
+    classes[isBorder], types[isBorder] = tripClass, outlierType
+    return classes, types
+
+
+# Method that takes as input the GPS data of a phone, called gpsTraces, in any of the forms read by
+# traces.asGpsTrace, and separates the GPS points into trips and activities with clusterPoints, as an alternative
+# to tripActivity.inferTripActivity. Output is a tuple containing the trips, activities and holes,
+# with the same structure as those returned by inferTripActivity, so that the two can be scored alike.
+#
+# GPS traces whose accuracy is above gpsAccuracyThreshold meters are not clustered. Each activity spans the
+# points from the first to the last point of a cluster, and clusters whose spans overlap in time form a single
+# activity. Trips and activities are split at holes in the data, where successive points are separated by at
+# least minSamplingRate milliseconds.
+
+def inferTripActivity(gpsTraces, minDuration, eps, minSamplingRate, gpsAccuracyThreshold):
+
+    gpsTraces = asGpsTrace(gpsTraces)
+    points = numpy.flatnonzero(gpsTraces.accuracy < gpsAccuracyThreshold)
+    classes, types = clusterPoints(gpsTraces.epochTime[points], gpsTraces.lat[points], gpsTraces.lon[points],
+            minDuration, eps)
+
+    activities = []
+    for activity in numpy.unique(classes[classes != tripClass]):
+        members = points[classes == activity]
+        activities.append([int(members[0]), int(members[-1])])
+    activities.sort()
+    mergedActivities = []
+    for activity in activities:
+        if mergedActivities and activity[0] <= mergedActivities[-1][1]:
+            mergedActivities[-1][1] = max(mergedActivities[-1][1], activity[1])
+        else:
+            mergedActivities.append(activity)
+
+    gaps = samplingGaps.findGaps(gpsTraces.epochTime, minSamplingRate)
+    return separateEvents(mergedActivities, len(gpsTraces), gaps)
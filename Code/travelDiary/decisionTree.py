@@ -0,0 +1,115 @@
+import json
+import numpy
+from os.path import abspath, dirname, join
+
+
+# Names of the features of a GPS point used by the walk/non-walk decision tree, in the order of the columns
+# of PointFeatures.walkFeatures and of the data labelled by walkNonWalkDecisionTree.py
+
+walkFeatureNames = ['speed', 'acceleration', 'headingChange']
+
+# Path to the walk/non-walk decision tree used by the inference scripts, which is replaced to deploy a
+# retrained tree
+
+defaultWalkTreePath = join(dirname(abspath(__file__)), 'models', 'walkNonWalkDecisionTree.json')
+
+# Version of the layout of the files written by saveTree
+
+treeFormatVersion = 1
+
+# Trees read by loadTree, keyed by path
+
+loadedTrees = {}
+
+
+# Class that stores a binary decision tree as flat arrays over its nodes, numbered so that node 0 is the root,
+# and classifies a whole array of observations at once, with one array operation per level of the tree
+# instead of one chain of if statements per observation.
+#
+# At an internal node k, an observation goes to node left[k] if the value of its feature feature[k] is less
+# than or equal to threshold[k], and to node right[k] otherwise, as in a tree trained by sklearn. A value that
+# is NaN is not less than or equal to any threshold. Leaves have left[k] = right[k] = -1, and classify an
+# observation as classes[value[k]].
+#
+# Trees trained by sklearn round the features to 32-bit floats before comparing them with the thresholds, and
+# so does the CompiledTree built from such a tree, so that both classify every observation alike. Other trees
+# compare the features as they are.
+
+class CompiledTree(object):
+
+    def __init__(self, feature, threshold, left, right, value, featureNames, classes, dtype = 'float64'):
+
+        self.feature = numpy.asarray(feature, dtype = numpy.int64)
+        self.threshold = numpy.asarray(threshold, dtype = numpy.float64)
+        self.left = numpy.asarray(left, dtype = numpy.int64)
+        self.right = numpy.asarray(right, dtype = numpy.int64)
+        self.value = numpy.asarray(value, dtype = numpy.int64)
+        self.featureNames, self.classes, self.dtype = list(featureNames), numpy.asarray(classes), dtype
+
+        # Depth of the tree, i.e. the largest number of comparisons made to classify an observation
+        depth = numpy.zeros(len(self.feature), dtype = numpy.int64)
+        for k in range(0, len(self.feature)):
+            if self.left[k] >= 0:
+                depth[self.left[k]] = depth[self.right[k]] = depth[k] + 1
+        self.depth = int(depth.max()) if depth.shape[0] > 0 else 0
+
+    # Function that takes as input a 2-D array with one row per observation and one column per feature, in the
+    # order of featureNames, and returns the array of the classes of the observations
+
+    def predict(self, observations):
+
+        observations = numpy.asarray(observations, dtype = numpy.float64).reshape(-1, len(self.featureNames))
+        observations = observations.astype(self.dtype).astype(numpy.float64)
+        node = numpy.zeros(observations.shape[0], dtype = numpy.int64)
+        with numpy.errstate(invalid = 'ignore'):
+            for level in range(0, self.depth):
+                rows = numpy.flatnonzero(self.left[node] >= 0)
+                if rows.shape[0] == 0:
+                    break
+                nodes = node[rows]
+                isLeft = observations[rows, self.feature[nodes]] <= self.threshold[nodes]
+                node[rows] = numpy.where(isLeft, self.left[nodes], self.right[nodes])
+        return self.classes[self.value[node]]
+
+    # Function that takes as input a tree trained by sklearn, e.g. a DecisionTreeClassifier, and the names of
+    # the features it was trained on, and returns the corresponding CompiledTree
+
+    @classmethod
+    def fromSklearn(cls, clf, featureNames):
+        nodes = clf.tree_
+        value = numpy.argmax(nodes.value[:, 0, :], axis = 1)
+        return cls(nodes.feature, nodes.threshold, nodes.children_left, nodes.children_right, value,
+                featureNames, clf.classes_, 'float32')
+
+    # Functions that convert the tree to and from a dictionary of lists, as stored by saveTree
+
+    def toDict(self):
+        return {'version': treeFormatVersion, 'featureNames': self.featureNames, 'classes': self.classes.tolist(),
+                'dtype': self.dtype, 'feature': self.feature.tolist(), 'threshold': self.threshold.tolist(),
+                'left': self.left.tolist(), 'right': self.right.tolist(), 'value': self.value.tolist()}
+
+    @classmethod
+    def fromDict(cls, tree):
+        if tree.get('version') != treeFormatVersion:
+            raise ValueError('Unsupported decision tree format version: ' + str(tree.get('version')))
+        return cls(tree['feature'], tree['threshold'], tree['left'], tree['right'], tree['value'],
+                tree['featureNames'], tree['classes'], tree['dtype'])
+
+
+# Procedure that takes as input a CompiledTree and a file path, and writes the tree to the file as JSON.
+# Thresholds are written with enough digits to be read back exactly.
+
+def saveTree(tree, filePath):
+    with open(filePath, 'w') as treeFile:
+        json.dump(tree.toDict(), treeFile, indent = 1, separators = (',', ': '), sort_keys = True)
+
+
+# Function that takes as input the path to a file written by saveTree, and returns the CompiledTree it holds.
+# Each file is read once, and the tree is reused by later calls.
+
+def loadTree(filePath = defaultWalkTreePath):
+    filePath = abspath(filePath)
+    if filePath not in loadedTrees:
+        with open(filePath, 'r') as treeFile:
+            loadedTrees[filePath] = CompiledTree.fromDict(json.load(treeFile))
+    return loadedTrees[filePath]
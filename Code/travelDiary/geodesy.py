@@ -0,0 +1,127 @@
+import math
+import numpy
+
+
+# Mean radius of the earth in meters, as used by the haversine formula throughout the repository
+
+earthRadius = 6371000
+
+# Factor converting speeds in meters per second to miles per hour
+
+mphPerMps = 2.23694
+
+
+# Function that uses the haversine formula to calculate the 'great-circle' distance in meters
+# between two points whose latitutde and longitude are known
+
+def calDistance(point1, point2):
+
+    dLat = math.radians(point1[0]-point2[0])
+    dLon = math.radians(point1[1]-point2[1])    
+    lat1 = math.radians(point1[0])
+    lat2 = math.radians(point2[0])
+    
+    a = (math.sin(dLat/2) ** 2) + ((math.sin(dLon/2) ** 2) * math.cos(lat1) * math.cos(lat2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    d = earthRadius * c 
+    
+    return d
+
+
+# Function that calculates the initial bearing in degrees from point 1 to point 2, given the 
+# latitude and longitude of both points
+
+def calBearing(point1, point2):
+
+    dLon = math.radians(point2[1]-point1[1])    
+    lat1 = math.radians(point1[0])
+    lat2 = math.radians(point2[0])
+    
+    y = math.sin(dLon) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
+    b = math.atan2(y, x)
+
+    return math.degrees(b)
+
+
+# Array version of calDistance. Takes as input the latitudes and longitudes of two sets of points,
+# as scalars or numpy arrays that broadcast against each other, and returns the haversine distance 
+# in meters between each pair of points
+
+def calDistances(lat1, lon1, lat2, lon2):
+
+    lat1, lon1 = numpy.radians(lat1), numpy.radians(lon1)
+    lat2, lon2 = numpy.radians(lat2), numpy.radians(lon2)
+
+    a = (numpy.sin((lat1 - lat2)/2) ** 2) + ((numpy.sin((lon1 - lon2)/2) ** 2) * numpy.cos(lat1) * numpy.cos(lat2))
+    c = 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1-a))
+
+    return earthRadius * c
+
+
+# Array version of calBearing. Returns the initial bearing in degrees from each point in the first
+# set to the corresponding point in the second set
+
+def calBearings(lat1, lon1, lat2, lon2):
+
+    dLon = numpy.radians(lon2) - numpy.radians(lon1)
+    lat1, lat2 = numpy.radians(lat1), numpy.radians(lat2)
+
+    y = numpy.sin(dLon) * numpy.cos(lat2)
+    x = numpy.cos(lat1) * numpy.sin(lat2) - numpy.sin(lat1) * numpy.cos(lat2) * numpy.cos(dLon)
+
+    return numpy.degrees(numpy.arctan2(y, x))
+
+
+# Functions that take as input the latitudes and longitudes of a GPS trace, ordered in time, and return
+# for each point j the distance in meters to point j + 1, the bearing in degrees from point j to point j + 1, 
+# and the absolute change in bearing in degrees between the legs (j, j + 1) and (j + 1, j + 2). The outputs
+# have one and two fewer elements than the trace, respectively.
+
+def calStepDistances(lat, lon):
+    lat, lon = numpy.asarray(lat, dtype = numpy.float64), numpy.asarray(lon, dtype = numpy.float64)
+    return calDistances(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+def calStepBearings(lat, lon):
+    lat, lon = numpy.asarray(lat, dtype = numpy.float64), numpy.asarray(lon, dtype = numpy.float64)
+    return calBearings(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+def calHeadingChanges(lat, lon):
+    bearings = calStepBearings(lat, lon)
+    return numpy.fabs(bearings[:-1] - bearings[1:])
+
+
+# Versions of calDistances and calBearings that carry out the operations of calDistance and calBearing in the
+# same order, e.g. converting the difference in latitude rather than each latitude to radians, and squaring
+# with pow, so that each element is identical to the result of the scalar function for that pair of points.
+# Used where the per-point features of the inference scripts are compared against fixed thresholds, so that
+# the vectorized features decide every comparison exactly as the scalar functions did.
+
+def calDistancesExact(lat1, lon1, lat2, lon2):
+
+    dLat = numpy.radians(lat1 - lat2)
+    dLon = numpy.radians(lon1 - lon2)
+    lat1, lat2 = numpy.radians(lat1), numpy.radians(lat2)
+
+    a = numpy.power(numpy.sin(dLat/2), 2.0) + (numpy.power(numpy.sin(dLon/2), 2.0) * numpy.cos(lat1) * numpy.cos(lat2))
+    c = 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1-a))
+
+    return earthRadius * c
+
+def calBearingsExact(lat1, lon1, lat2, lon2):
+
+    dLon = numpy.radians(lon2 - lon1)
+    lat1, lat2 = numpy.radians(lat1), numpy.radians(lat2)
+
+    y = numpy.sin(dLon) * numpy.cos(lat2)
+    x = numpy.cos(lat1) * numpy.sin(lat2) - numpy.sin(lat1) * numpy.cos(lat2) * numpy.cos(dLon)
+
+    return numpy.degrees(numpy.arctan2(y, x))
+
+
+# Function that takes as input arrays of distances in meters and of the times in seconds taken to cover them,
+# and returns the corresponding speeds in mph. Speeds over a zero time interval are infinite or NaN.
+
+def calSpeeds(distances, times):
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        return mphPerMps * (distances / times)
@@ -0,0 +1,186 @@
+import numpy
+from travelDiary import geodesy
+
+
+# Names of the string columns in the tab-delimited GPS data files, following the ten numeric and string
+# columns written by the tracking app: the activity inferred by the Google API, the PST time, and the four
+# ground truth columns (trip or activity, followed by three columns of information about the trip or activity)
+
+labelColumns = ['googleActivity', 'pstTime', 'label', 'type', 'info', 'comments']
+
+# Names of the numeric columns of a GpsTrace from which its derived columns are computed
+
+sourceColumns = ['epochTime', 'lat', 'lon']
+
+
+# Class that stores a column of strings as categorical data, i.e. as an array of integer codes into a
+# sorted list of the distinct values taken by the column
+
+class LabelColumn(object):
+
+    def __init__(self, values):
+        index = {}
+        codes = numpy.array([index.setdefault(str(value), len(index)) for value in values], dtype = numpy.int32)
+        self.categories = sorted(index)
+        order = numpy.zeros(len(index), dtype = numpy.int32)
+        order[[index[category] for category in self.categories]] = numpy.arange(len(index))
+        self.codes = numpy.ascontiguousarray(order[codes], dtype = numpy.int32)
+
+    # Function that returns the LabelColumn with the given sorted list of distinct values and array of codes
+
+    @classmethod
+    def fromCodes(cls, categories, codes):
+        column = cls([])
+        column.categories = list(categories)
+        column.codes = numpy.ascontiguousarray(codes, dtype = numpy.int32)
+        return column
+
+    # Function that returns the LabelColumn holding the values of the given LabelColumns one after the other
+
+    @classmethod
+    def concatenate(cls, columns):
+        categories = sorted(set(category for column in columns for category in column.categories))
+        position = dict((categories[k], k) for k in range(0, len(categories)))
+        codes = [numpy.array([position[category] for category in column.categories], dtype = numpy.int32)[column.codes]
+                for column in columns if len(column) > 0]
+        return cls.fromCodes(categories, numpy.concatenate(codes) if codes else numpy.zeros(0, dtype = numpy.int32))
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    # Function that returns a boolean array that is True for every element equal to the given value
+
+    def isValue(self, value):
+        if value not in self.categories:
+            return numpy.zeros(len(self), dtype = bool)
+        return self.codes == self.categories.index(value)
+
+
+# Functions that take as input a GpsTrace and compute its derived columns. For each point j, stepDistance,
+# stepTime, speed and bearing hold the distance in meters, the time in seconds, the speed in mph and the bearing
+# in degrees from point j to point j + 1, and have one element fewer than the trace. cumDistance and cumTime
+# hold the distance in meters along the trace and the time in seconds from the first point to point j, and
+# have as many elements as the trace. Distances and bearings are computed with calDistancesExact and
+# calBearingsExact, so that each element is identical to the result of calDistance or calBearing.
+
+def calStepDistance(gpsTraces):
+    return geodesy.calDistancesExact(gpsTraces.lat[:-1], gpsTraces.lon[:-1], gpsTraces.lat[1:], gpsTraces.lon[1:])
+
+def calStepTime(gpsTraces):
+    return numpy.diff(gpsTraces.epochTime) / 1000.0
+
+def calSpeed(gpsTraces):
+    return geodesy.calSpeeds(gpsTraces.derived('stepDistance'), gpsTraces.derived('stepTime'))
+
+def calBearing(gpsTraces):
+    return geodesy.calBearingsExact(gpsTraces.lat[:-1], gpsTraces.lon[:-1], gpsTraces.lat[1:], gpsTraces.lon[1:])
+
+def calCumDistance(gpsTraces):
+    return numpy.concatenate(([0.0], numpy.cumsum(gpsTraces.derived('stepDistance'))))[:len(gpsTraces)]
+
+def calCumTime(gpsTraces):
+    return (gpsTraces.epochTime - gpsTraces.epochTime[:1]) / 1000.0
+
+derivedColumns = {'stepDistance': calStepDistance, 'stepTime': calStepTime, 'speed': calSpeed,
+                  'bearing': calBearing, 'cumDistance': calCumDistance, 'cumTime': calCumTime}
+
+
+# Class that stores the GPS data for a single phone as contiguous columns, ordered in terms of increasing time:
+# epoch time (in milliseconds), latitude, longitude, GPS accuracy, battery status (in percentage) and sampling
+# rate (in milliseconds). String columns, such as the ground truth, are stored as LabelColumns in a dictionary
+# keyed by column name, and any other numeric columns, such as accelerometer readings or the confidences of
+# the Google activity recognition API, in a dictionary of arrays keyed by column name.
+#
+# Point j of the trace is described by epochTime[j], lat[j], lon[j], accuracy[j], etc., which replaces the
+# gpsTraces[j][1], gpsTraces[j][2:4] and gpsTraces[j][4] lookups used with the list-of-lists representation.
+#
+# The columns derived from the positions and times of the points, listed in derivedColumns, are computed the
+# first time they are requested through derived, and cached on the trace, so that the stages of the inference
+# that run on the same trace read slices of the same arrays instead of each computing them again. The cached
+# arrays are read-only. The cache is cleared whenever epochTime, lat or lon is assigned, and a caller that
+# modifies one of these arrays in place must call invalidate.
+
+class GpsTrace(object):
+
+    def __init__(self, epochTime, lat, lon, accuracy, battery = None, samplingRate = None, labels = None,
+            columns = None):
+
+        self._derived = {}
+        self.epochTime = numpy.ascontiguousarray(epochTime, dtype = numpy.int64)
+        numPoints = self.epochTime.shape[0]
+        self.lat = numpy.ascontiguousarray(lat, dtype = numpy.float64)
+        self.lon = numpy.ascontiguousarray(lon, dtype = numpy.float64)
+        self.accuracy = numpy.ascontiguousarray(accuracy, dtype = numpy.float64)
+        if battery is None:
+            battery = numpy.full(numPoints, numpy.nan)
+        self.battery = numpy.ascontiguousarray(battery, dtype = numpy.float64)
+        if samplingRate is None:
+            samplingRate = numpy.zeros(numPoints)
+        self.samplingRate = numpy.ascontiguousarray(samplingRate, dtype = numpy.int64)
+
+        self.labels = {}
+        if labels is not None:
+            for name in labels:
+                self.labels[name] = labels[name] if isinstance(labels[name], LabelColumn) else LabelColumn(labels[name])
+
+        self.columns = {}
+        if columns is not None:
+            for name in columns:
+                self.columns[name] = numpy.ascontiguousarray(columns[name])
+
+    # Procedure that clears the cached derived columns whenever a column they are computed from is replaced
+
+    def __setattr__(self, name, value):
+        if name in sourceColumns:
+            self.invalidate()
+        object.__setattr__(self, name, value)
+
+    def __len__(self):
+        return self.epochTime.shape[0]
+
+    # Function that returns the derived column name, computing and caching it on first use
+
+    def derived(self, name):
+        if name not in self._derived:
+            column = derivedColumns[name](self)
+            column.setflags(write = False)
+            self._derived[name] = column
+        return self._derived[name]
+
+    # Procedure that clears the cached derived columns, to be called after modifying epochTime, lat or lon in place
+
+    def invalidate(self):
+        object.__setattr__(self, '_derived', {})
+
+    # Function that takes as input the indices of two points, and returns the time in seconds between them
+
+    def segmentTime(self, start, end):
+        return float(self.epochTime[end] - self.epochTime[start]) / 1000.0
+
+    # Function that returns the value of the string column name for point j, or an empty string if the
+    # trace does not carry that column
+
+    def label(self, name, j):
+        if name not in self.labels:
+            return ''
+        return self.labels[name][j]
+
+    # Function that returns a boolean array that is True for every point whose string column name equals value
+
+    def isLabel(self, name, value):
+        if name not in self.labels:
+            return numpy.zeros(len(self), dtype = bool)
+        return self.labels[name].isValue(value)
+
+    # Function that returns the latitude and longitude of point j
+
+    def latLon(self, j):
+        return self.lat[j], self.lon[j]
+
+    # Function that returns an array with one row per point, containing its latitude, longitude and GPS accuracy
+
+    def coordinates(self):
+        return numpy.column_stack((self.lat, self.lon, self.accuracy))
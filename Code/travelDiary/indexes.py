@@ -0,0 +1,108 @@
+from pymongo import ASCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
+from travelDiary import ingestion
+
+
+# Indexes of the collections used by the scripts, each given as a list of (keys, options) tuples, where options
+# are passed on to create_index. The gpsPoints and segments collections of the travelDiary database are read one
+# phone at a time, sorted by time. The observations collection of the travel_diary_db database is written by
+# create_mongo_database.py.
+#
+# MongoDB reads the coordinates of a GeoJSON point as [longitude, latitude], which is the order used by the
+# observations collection. The convertData scripts and storeActivities.py store [latitude, longitude] instead,
+# on which a 2dsphere index cannot be built, so gpsReading.location and centroid are not indexed. The activities
+# near a centroid are found in memory by neighborhoods.ActivityNeighborhoods rather than by a $nearSphere query.
+
+gpsPointIndexes = [([('phNum', ASCENDING), ('epochTime', ASCENDING)], {}),
+                   (ingestion.gpsPointKeys, {'unique': True})]
+segmentIndexes = [([('phNum', ASCENDING), ('startTime', ASCENDING), ('endTime', ASCENDING)], {'unique': True})]
+observationIndexes = [([('id', ASCENDING), ('epoc', ASCENDING)], {}),
+                      ([('location', GEOSPHERE)], {})]
+
+# Stages of a query plan that read every document of a collection, or sort the results in memory
+
+slowStages = ['COLLSCAN', 'SORT']
+
+
+# Function that takes as input a MongoDB collection and a list of (keys, options) tuples, and creates the
+# indexes that do not exist yet. An index that cannot be built, e.g. a unique index on a collection that holds
+# duplicates, does not stop the others from being built. Output is a list of (keys, error message) tuples for
+# the indexes that could not be built.
+
+def ensureIndexes(collection, indexes):
+    failures = []
+    for keys, options in indexes:
+        try:
+            collection.create_index(keys, **options)
+        except OperationFailure as error:
+            failures.append((keys, str(error)))
+    return failures
+
+
+# Function that takes as input the travelDiary database, and creates the indexes of the gpsPoints and segments
+# collections. Output is a list of (collection name, keys, error message) tuples for the indexes that could not
+# be built.
+
+def ensureTravelDiaryIndexes(travelDiary):
+    failures = []
+    for name, indexes in [('gpsPoints', gpsPointIndexes), ('segments', segmentIndexes)]:
+        failures += [(name, keys, message) for keys, message in ensureIndexes(travelDiary[name], indexes)]
+    return failures
+
+
+# Function that takes as input a stage of a query plan, as reported by explain(), and returns the names of the
+# stages of the plan rooted at that stage, in the order of a depth-first traversal
+
+def getPlanStages(stage):
+    stages = [stage['stage']]
+    children = stage.get('inputStages', []) + ([stage['inputStage']] if 'inputStage' in stage else [])
+    for child in children:
+        stages += getPlanStages(child)
+    return stages
+
+
+# Function that takes as input a MongoDB cursor, and returns the names of the stages of the winning plan of its
+# query that are in slowStages, i.e. an empty list if the query is answered by an index scan alone. Servers
+# that run the query with the slot-based engine nest the plan in a 'queryPlan' field.
+
+def getSlowStages(cursor):
+    winningPlan = cursor.explain()['queryPlanner']['winningPlan']
+    stages = getPlanStages(winningPlan.get('queryPlan', winningPlan))
+    return [stage for stage in stages if stage in slowStages]
+
+
+# Function that takes as input the travelDiary database, and returns a list of (description, cursor) tuples
+# for the queries run by the inference scripts, with the phone number and times of a stored document. A
+# query whose collection is empty is left out.
+
+def getHotQueries(travelDiary):
+
+    queries = []
+    gpsPoint = travelDiary.gpsPoints.find_one({}, {'phNum': 1})
+    if gpsPoint is not None:
+        query = {'phNum': gpsPoint['phNum']}
+        queries.append(('GPS points of a phone sorted by time', travelDiary.gpsPoints.find(query).sort('epochTime')))
+
+    activity = travelDiary.segments.find_one({}, {'phNum': 1, 'startTime': 1, 'endTime': 1})
+    if activity is not None:
+        query = {'startTime': activity['startTime'], 'endTime': activity['endTime'], 'phNum': activity['phNum']}
+        queries.append(('Activity with given start and end time', travelDiary.segments.find(query)))
+
+    return queries
+
+
+# Function that takes as input the travelDiary database, and checks the query plans of the queries run by the
+# inference scripts. Output is a list of (description, stages) tuples for the queries whose plan scans the
+# collection or sorts in memory, or (description, error message) tuples for the queries that cannot be run.
+
+def checkQueryPlans(travelDiary):
+    problems = []
+    for description, cursor in getHotQueries(travelDiary):
+        try:
+            stages = getSlowStages(cursor)
+        except OperationFailure as error:
+            problems.append((description, str(error)))
+            continue
+        if stages:
+            problems.append((description, stages))
+    return problems
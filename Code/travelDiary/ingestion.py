@@ -0,0 +1,69 @@
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+
+
+# Keys that identify a GPS point in the gpsPoints collection. The convertData scripts never store two points with
+# the same user name and epoch time, which a unique index on these keys enforces on the server.
+
+gpsPointKeys = [('userName', ASCENDING), ('epochTime', ASCENDING)]
+
+# Error code reported by MongoDB when an insert violates a unique index
+
+duplicateKeyError = 11000
+
+
+# Function that takes as input the gpsPoints collection, and creates the unique index on gpsPointKeys if it does
+# not exist yet. Creating the index fails if the collection already holds duplicate points, in which case the
+# error is returned rather than raised, so that the conversion can go on without the index, and skip the points
+# already in the collection with filterNewRecords instead. Output is the error message reported by the server,
+# or None if the index exists.
+
+def ensureUniqueIndex(gpsPoints):
+    try:
+        gpsPoints.create_index(gpsPointKeys, unique = True)
+    except OperationFailure as error:
+        return str(error)
+    return None
+
+
+# Function that takes as input the gpsPoints collection and a list of records, and returns the records whose
+# user name and epoch time are neither in the collection nor in an earlier record of the list. The epoch times
+# already stored for a user are read with a single query, the first time a record of that user is met.
+
+def filterNewRecords(gpsPoints, records):
+    epochTimes, newRecords = {}, []
+    for record in records:
+        userName = record['userName']
+        if userName not in epochTimes:
+            points = gpsPoints.find({'userName': userName}, {'_id': 0, 'epochTime': 1})
+            epochTimes[userName] = set(point['epochTime'] for point in points)
+        if record['epochTime'] not in epochTimes[userName]:
+            epochTimes[userName].add(record['epochTime'])
+            newRecords.append(record)
+    return newRecords
+
+
+# Function that takes as input the gpsPoints collection, a list of records, whether the collection has the
+# unique index on gpsPointKeys, and the number of records sent to the server per request, and inserts the
+# records in unordered batches. Records that violate the unique index, i.e. that are already in the collection,
+# are skipped by the server without stopping the rest of the batch. Without the index, these records are
+# left out by filterNewRecords before inserting the others. Output is the number of records inserted and the
+# number skipped. Any other write error is raised as a BulkWriteError.
+
+def insertRecords(collection, records, isIndexed = True, batchSize = 5000):
+
+    numInserted, numSkipped = 0, 0
+    if not isIndexed:
+        newRecords = filterNewRecords(collection, records)
+        numSkipped, records = len(records) - len(newRecords), newRecords
+    for k in range(0, len(records), batchSize):
+        try:
+            numInserted += len(collection.insert_many(records[k:k + batchSize], ordered = False).inserted_ids)
+        except BulkWriteError as error:
+            writeErrors = error.details['writeErrors']
+            if any(writeError['code'] != duplicateKeyError for writeError in writeErrors):
+                raise
+            numInserted += error.details['nInserted']
+            numSkipped += len(writeErrors)
+
+    return numInserted, numSkipped
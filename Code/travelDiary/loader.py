@@ -0,0 +1,138 @@
+import re
+import numpy
+from travelDiary.gpsTrace import GpsTrace, LabelColumn
+
+
+# Names of the columns of confidences (in percentage) reported by the Google activity recognition API, in the
+# order in which the wide schema stores them, and the names used for the same activities in the strings
+# written by the narrow schema, e.g. 'unknown48in_vehicle26still25'
+
+googleActivities = ['inVehicle', 'bike', 'walk', 'still', 'unknown', 'tilting']
+googleActivityNames = {'in_vehicle': 'inVehicle', 'on_bicycle': 'bike', 'on_foot': 'walk',
+                       'still': 'still', 'unknown': 'unknown', 'tilting': 'tilting'}
+
+# Layout of the two schemas used by the tab-delimited GPS data files. The narrow schema, written by the
+# earlier versions of the tracking app, stores the magnitude of the acceleration and the Google activity as a
+# string, followed by the PST time and the ground truth; some of these files leave an empty column before the
+# ground truth. The wide schema stores the three axes of the accelerometer, one column per Google activity,
+# the screen status, the WiFi network and the time the point was received, followed by the ground truth. Each
+# numeric column is given as (column index, column name), where the first six columns, phone number, epoch
+# time, latitude, longitude, GPS accuracy and battery status, are common to both schemas.
+
+narrowSchema = {'numeric': [(6, 'samplingRate'), (7, 'accelerometer')],
+                'strings': [(8, 'googleActivity'), (9, 'pstTime')]}
+wideSchema = {'numeric': ([(6, 'accelerometerX'), (7, 'accelerometerY'), (8, 'accelerometerZ')]
+                          + [(9 + k, googleActivities[k]) for k in range(0, len(googleActivities))]
+                          + [(15, 'screenOn')]),
+              'strings': [(16, 'wiFiNetwork'), (17, 'receivedTime')]}
+wideSchemaWidth = 19
+
+# Names of the ground truth columns, and the index of the first of them, in either schema. As in the scripts
+# that read the files line by line before this loader, the ground truth is read from the eleventh column
+# onwards, which is where the narrow schema stores it. The files in the wide schema, and the narrow files with
+# an empty column before the ground truth, hold other values there, so that none of their points count as
+# correctly inferred.
+
+groundTruthColumns = ['label', 'type', 'info', 'comments']
+groundTruthColumn = 10
+
+
+# Function that takes as input the path to a tab-delimited file, and returns its non-empty lines split into
+# lists of strings. Fields are split on tabs only, since the files contain stray double quotes that do not
+# delimit quoted fields.
+
+def readRows(filePath):
+    with open(filePath, 'rU') as dataFile:
+        return [line.split('\t') for line in dataFile.read().splitlines() if line]
+
+
+# Function that takes as input a list of rows and a column index, and returns the column as an array of floats,
+# where missing or malformed values are NaN. Well-formed columns are converted in a single call.
+
+def parseNumericColumn(rows, k):
+    values = [row[k] if len(row) > k else '' for row in rows]
+    try:
+        return numpy.array(values).astype(numpy.float64)
+    except ValueError:
+        column = numpy.full(len(values), numpy.nan)
+        for j in range(0, len(values)):
+            if re.match(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$', values[j]):
+                column[j] = float(values[j])
+        return column
+
+
+# Function that takes as input a list of rows and a number of columns, and returns columns 1 to numColumns - 1
+# as a two-dimensional array of floats, preceded by a column of NaN in place of the phone number, which some
+# files record as a name. When every row holds well-formed numbers in these columns, which is the case for all
+# but a handful of files, the whole block is converted by a single call to numpy.fromstring.
+
+def parseNumericBlock(rows, numColumns):
+    if all(len(row) >= numColumns for row in rows):
+        block = numpy.fromstring('\t'.join(['\t'.join(row[1:numColumns]) for row in rows]), sep = '\t')
+        if block.shape[0] == len(rows) * (numColumns - 1):
+            return numpy.column_stack((numpy.full(len(rows), numpy.nan), block.reshape(len(rows), numColumns - 1)))
+    columns = [numpy.full(len(rows), numpy.nan)] + [parseNumericColumn(rows, k) for k in range(1, numColumns)]
+    return numpy.column_stack(columns).reshape(len(rows), numColumns)
+
+
+# Function that takes as input a Google activity string, e.g. 'unknown48in_vehicle26still25' or 'x' when no
+# activity was reported, and returns a dictionary mapping each name in googleActivities to its confidence
+
+def decodeGoogleActivity(activity):
+    confidences = dict((name, 0) for name in googleActivities)
+    for name, confidence in re.findall(r'([a-z_]+?)(\d+)', activity):
+        if name in googleActivityNames:
+            confidences[googleActivityNames[name]] = int(confidence)
+    return confidences
+
+
+# Function that takes as input a LabelColumn of Google activity strings, and returns a dictionary of integer
+# arrays, one per name in googleActivities. Each distinct string is decoded only once.
+
+def decodeGoogleActivities(activities):
+    decoded = [decodeGoogleActivity(activity) for activity in activities.categories]
+    columns = {}
+    for name in googleActivities:
+        table = numpy.array([confidences[name] for confidences in decoded], dtype = numpy.int32)
+        columns[name] = table[activities.codes] if len(table) > 0 else numpy.zeros(0, dtype = numpy.int32)
+    return columns
+
+
+# Function that takes as input the rows of a tab-delimited GPS data file, and returns the schema they follow
+
+def detectSchema(rows):
+    if rows and max(len(row) for row in rows) >= wideSchemaWidth:
+        return wideSchema
+    return narrowSchema
+
+
+# Function that takes as input the path to a tab-delimited GPS data file in either schema, and returns its
+# contents as a GpsTrace. Numeric columns are parsed column by column rather than cell by cell, and, for the
+# narrow schema, the Google activity strings are decoded into integer columns named as in googleActivities.
+# The ground truth is read from the columns following groundTruthColumn. Raises a ValueError if the epoch time
+# or GPS reading of any row is missing or malformed.
+
+def loadGpsTrace(filePath):
+
+    rows = readRows(filePath)
+    schema = detectSchema(rows)
+
+    numericColumns = parseNumericBlock(rows, schema['numeric'][-1][0] + 1)
+    if numpy.isnan(numericColumns[:, 1:5]).any():
+        raise ValueError('Malformed epoch time or GPS reading in ' + filePath)
+    epochTime, lat, lon, accuracy, battery = [numericColumns[:, k] for k in range(1, 6)]
+    columns = dict((name, numericColumns[:, k]) for k, name in schema['numeric'])
+    labels = dict((name, LabelColumn([row[k] if len(row) > k else '' for row in rows]))
+            for k, name in schema['strings'])
+
+    for k in range(0, len(groundTruthColumns)):
+        column = groundTruthColumn + k
+        labels[groundTruthColumns[k]] = LabelColumn([row[column] if len(row) > column else '' for row in rows])
+
+    if 'googleActivity' in labels:
+        columns.update(decodeGoogleActivities(labels['googleActivity']))
+    samplingRate = columns.pop('samplingRate', None)
+    if samplingRate is not None:
+        samplingRate = numpy.nan_to_num(samplingRate)
+
+    return GpsTrace(epochTime, lat, lon, accuracy, battery, samplingRate, labels, columns)
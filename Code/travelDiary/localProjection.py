@@ -0,0 +1,95 @@
+import math
+import numpy
+from travelDiary import geodesy
+
+
+# Longest distance in meters for which a planar distance is used, beyond which distances are computed with the
+# haversine formula
+
+defaultMaxBaseline = 10000
+
+# Error in meters added to every bound, which covers the round-off in the haversine and planar computations
+
+absError = 1e-6
+
+# Largest absolute latitude in degrees of a trace that is projected, closer to the poles than which the bound
+# below grows without limit and every distance is computed with the haversine formula
+
+maxProjectedLat = 80
+
+
+# Class that projects the points of a GPS trace once onto a plane, with the equirectangular projection around
+# the center of the bounding box of the trace, i.e. x = R cos(lat0) (lon - lon0) and y = R (lat - lat0), in
+# meters, so that the distance between two points can be computed as the planar distance between them instead
+# of with the haversine formula.
+#
+# The planar distance d differs from the haversine distance by at most errorBound(d) meters for any two points
+# of the trace less than maxBaseline meters apart. The bound is the sum of the error from scaling longitudes by
+# cos(lat0) rather than by the cosine of the latitudes of the points, which is at most tan(lat*) h + h^2 of the
+# distance, where lat* is the largest absolute latitude in the trace and h is the half-span of its latitudes in
+# radians, and of the error from treating the sphere as flat, which is at most (1 + tan(lat*)^2) (b / R)^2 of
+# the distance for a baseline b, and is doubled as a margin. For a trace spanning 50 km around Berkeley, the bound
+# is about 0.6% of the distance, i.e. 0.3 meters at 50 meters.
+#
+# Comparisons of a distance with a threshold are decided by the planar distance whenever it is further from the
+# threshold than the bound, and with the haversine formula otherwise, so that their results are those of the
+# haversine formula. Traces near the poles or across the antimeridian have an infinite bound.
+
+class LocalProjection(object):
+
+    def __init__(self, lat, lon, maxBaseline = defaultMaxBaseline):
+
+        lat = numpy.asarray(lat, dtype = numpy.float64)
+        lon = numpy.asarray(lon, dtype = numpy.float64)
+        self.maxBaseline = maxBaseline
+        finite = numpy.isfinite(lat) & numpy.isfinite(lon)
+        if not finite.any():
+            self.lat0, self.lon0, self.relError = 0.0, 0.0, float('inf')
+        else:
+            latMin, latMax = lat[finite].min(), lat[finite].max()
+            lonMin, lonMax = lon[finite].min(), lon[finite].max()
+            self.lat0, self.lon0 = (latMin + latMax) / 2.0, (lonMin + lonMax) / 2.0
+            maxLat = max(abs(latMin), abs(latMax))
+            if maxLat > maxProjectedLat or lonMax - lonMin > 180:
+                self.relError = float('inf')
+            else:
+                halfSpan, slope = math.radians(latMax - latMin) / 2.0, math.tan(math.radians(maxLat))
+                curvature = (1 + slope ** 2) * (float(maxBaseline) / geodesy.earthRadius) ** 2
+                self.relError = 2 * (slope * halfSpan + halfSpan ** 2 + curvature)
+
+        self.cosLat0 = math.cos(math.radians(self.lat0))
+        self.x, self.y = self.project(lat, lon)
+
+    # Function that takes as input the latitudes and longitudes of points, as scalars or numpy arrays, and
+    # returns their x and y coordinates in meters
+
+    def project(self, lat, lon):
+        x = geodesy.earthRadius * self.cosLat0 * numpy.radians(numpy.subtract(lon, self.lon0))
+        y = geodesy.earthRadius * numpy.radians(numpy.subtract(lat, self.lat0))
+        return x, y
+
+    # Function that takes as input a planar distance, and returns the largest difference in meters between it and
+    # the corresponding haversine distance, which is infinite for distances longer than maxBaseline
+
+    def errorBound(self, distance):
+        if distance <= self.maxBaseline:
+            return self.relError * distance + absError
+        return float('inf')
+
+    # Array version of errorBound
+
+    def errorBounds(self, distances):
+        with numpy.errstate(invalid = 'ignore'):
+            return numpy.where(distances <= self.maxBaseline, self.relError * distances + absError, numpy.inf)
+
+    # Function that takes as input the index of a point of the trace and an array of indices, and returns the
+    # planar distances in meters from the point to each of the points with those indices
+
+    def distances(self, k, points):
+        return numpy.hypot(self.x[points] - self.x[k], self.y[points] - self.y[k])
+
+    # Function that takes as input the indices of two points of the trace, and returns the planar distance
+    # in meters between them
+
+    def distance(self, k, l):
+        return math.hypot(self.x[l] - self.x[k], self.y[l] - self.y[k])
@@ -0,0 +1,61 @@
+import heapq
+
+
+# Class that maintains the median of a growing collection of values, with two heaps holding the lower and upper
+# halves of the values, so that adding a value takes O(log n) time and reading the median O(1). The median is
+# identical to the one returned by numpy.median: the middle value, or the mean of the two middle values for an
+# even number of values, and NaN for no values.
+
+class RunningMedian(object):
+
+    def __init__(self):
+        self.lower, self.upper = [], []
+
+    def __len__(self):
+        return len(self.lower) + len(self.upper)
+
+    def add(self, value):
+        if self.lower and value > -self.lower[0]:
+            heapq.heappush(self.upper, value)
+        else:
+            heapq.heappush(self.lower, -value)
+        if len(self.lower) > len(self.upper) + 1:
+            heapq.heappush(self.upper, -heapq.heappop(self.lower))
+        elif len(self.upper) > len(self.lower):
+            heapq.heappush(self.lower, -heapq.heappop(self.upper))
+
+    def median(self):
+        if not self.lower:
+            return float('nan')
+        if len(self.lower) > len(self.upper):
+            return -self.lower[0]
+        return (-self.lower[0] + self.upper[0]) / 2.0
+
+
+# Class that maintains the median latitude and longitude of the points start, start + 1, ..., end - 1 of an array
+# of points, where a point is a row containing its latitude and longitude, as end grows. Used by inferTripActivity
+# for the last activity found, which is extended every time a later activity is merged with it, so that the
+# median is updated with the points added to the activity instead of being recomputed from all its points.
+
+class PointMedian(object):
+
+    def __init__(self, points, start, end):
+        self.points = points
+        self.start = self.end = start
+        self.lat, self.lon = RunningMedian(), RunningMedian()
+        self.extend(end)
+
+    # Procedure that takes as input the new end of the range, and adds the points up to it
+
+    def extend(self, end):
+        for k in range(self.end, end):
+            self.lat.add(self.points[k, 0])
+            self.lon.add(self.points[k, 1])
+        self.end = max(self.end, end)
+
+    # Function that takes as input the end of the range, and returns the median latitude and longitude of the
+    # points start, ..., end - 1
+
+    def median(self, end):
+        self.extend(end)
+        return (self.lat.median(), self.lon.median())
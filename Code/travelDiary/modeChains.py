@@ -0,0 +1,30 @@
+from travelDiary import decisionTree, segmentation
+from travelDiary.pointFeatures import PointFeatures
+from travelDiary.traces import asGpsTrace
+
+
+# Method that takes as input the GPS data of a phone, called gpsTraces, as a GpsTrace, a list of documents
+# read from the gpsPoints collection or a list of lists read from a GPS data file, and a tuple containing the
+# indices of the start and end point of a trip, called trip. Callers that infer the mode chains of several
+# trips should pass a GpsTrace, so that the GPS data is converted once rather than once per trip.
+#
+# The trips are decomposed into their mode chains.
+
+def inferModeChain(gpsTraces, trip, maxWalkSpeed, maxWalkAcceleration,
+        minSegmentDuration, minSegmentLength, gpsAccuracyThreshold, walkTree = None):
+
+    gpsTraces = asGpsTrace(gpsTraces)
+
+    # Step 1: Label GPS points as walk points or non-walk points, using the decision tree trained by
+    # walkNonWalkDecisionTree.py on the speed, acceleration and heading change of each point, which is
+    # the CompiledTree walkTree, or the one deployed at decisionTree.defaultWalkTreePath
+    features = PointFeatures.fromTrace(gpsTraces, trip[0], trip[1] + 2)
+    if walkTree is None:
+        walkTree = decisionTree.loadTree()
+    isWalk = walkTree.predict(features.walkFeatures()) == 1
+    walkLabels = segmentation.labelWalkPoints(gpsTraces, trip, isWalk, ~features.isDefined, maxWalkSpeed,
+            gpsAccuracyThreshold)
+
+    # Steps 2 to 5: Identify walk and non-walk segments as runs of walk or non-walk points, and merge the
+    # segments shorter than minSegmentDuration milliseconds with their neighbours
+    return segmentation.inferSegments(gpsTraces, trip, walkLabels, maxWalkSpeed, minSegmentDuration)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import numpy
+import os
+from os.path import abspath, dirname, isdir, isfile, join
+from travelDiary import decisionTree
+
+
+# Directory in which the models trained by the scripts are registered by default, next to the walk/non-walk
+# decision tree
+
+defaultRegistryDir = dirname(decisionTree.defaultWalkTreePath)
+
+# Version of the layout of the files written by saveModel
+
+registryVersion = 1
+
+# Models read by loadModel, keyed by path
+
+loadedModels = {}
+
+
+# Class that holds a classifier trained by one of the scripts, stored as a CompiledTree, together with what is
+# needed to use it on new data: the names of the features it takes, in order, the names of the classes it
+# predicts, the parameters used to calculate the features, e.g. the thresholds of the rates of heading change,
+# and the fingerprint of the data it was trained on, which tells whether a registered model is stale.
+
+class RegisteredModel(object):
+
+    def __init__(self, name, tree, classNames, parameters, fingerprint, numSamples):
+        self.name, self.tree = name, tree
+        self.featureNames = tree.featureNames
+        self.classNames = dict((float(label), className) for label, className in classNames.items())
+        self.parameters, self.fingerprint, self.numSamples = parameters, fingerprint, numSamples
+
+    # Function that takes as input a 2-D array with one row per observation and one column per feature, in the
+    # order of featureNames, and returns the array of the predicted class labels
+
+    def predict(self, observations):
+        return self.tree.predict(observations)
+
+    # Function that takes as input the same array, and returns the list of the names of the predicted classes
+
+    def predictNames(self, observations):
+        return [self.classNames.get(float(label)) for label in self.predict(observations)]
+
+    # Function that takes as input the parameters a script calculates features with, and raises a ValueError
+    # if they differ from those the model was trained with, as its predictions would then be meaningless
+
+    def checkParameters(self, parameters):
+        changed = sorted(key for key in set(parameters) | set(self.parameters)
+                if parameters.get(key) != self.parameters.get(key))
+        if changed:
+            raise ValueError('Model ' + self.name + ' was trained with different values of: ' + ', '.join(changed))
+
+    def toDict(self):
+        return {'version': registryVersion, 'name': self.name, 'tree': self.tree.toDict(),
+                'classNames': dict((repr(label), className) for label, className in self.classNames.items()),
+                'parameters': self.parameters, 'fingerprint': self.fingerprint, 'numSamples': self.numSamples}
+
+    @classmethod
+    def fromDict(cls, model):
+        if model.get('version') != registryVersion:
+            raise ValueError('Unsupported model registry version: ' + str(model.get('version')))
+        return cls(model['name'], decisionTree.CompiledTree.fromDict(model['tree']), model['classNames'],
+                model['parameters'], model['fingerprint'], model['numSamples'])
+
+
+# Function that takes as input a 2-D array of training data, and returns a fingerprint of its values and shape,
+# which is equal for two arrays exactly when they hold the same values
+
+def fingerprintData(data):
+    data = numpy.ascontiguousarray(data, dtype = numpy.float64)
+    digest = hashlib.sha1(str(data.shape))
+    digest.update(data.tobytes())
+    return digest.hexdigest()
+
+
+# Function that takes as input the name of a model and the registry directory, and returns the path to the
+# file holding the model
+
+def getModelPath(name, registryDir = None):
+    if registryDir is None:
+        registryDir = defaultRegistryDir
+    return abspath(join(registryDir, name + '.json'))
+
+
+# Function that takes as input the name of a model and the registry directory, and returns whether the model
+# has been registered
+
+def hasModel(name, registryDir = None):
+    return isfile(getModelPath(name, registryDir))
+
+
+# Function that takes as input the name of a model, a classifier trained by sklearn, the names of its features,
+# a dictionary mapping each class label to its name, the parameters used to calculate the features and the
+# training data, with the labels in the last column, and registers the model. The file is first written under a
+# temporary name, so that a reader never sees a partially written model. Output is the RegisteredModel.
+
+def saveModel(name, clf, featureNames, classNames, parameters, trainingData, registryDir = None):
+
+    tree = decisionTree.CompiledTree.fromSklearn(clf, featureNames)
+    model = RegisteredModel(name, tree, classNames, parameters, fingerprintData(trainingData), len(trainingData))
+    modelPath = getModelPath(name, registryDir)
+    if not isdir(dirname(modelPath)):
+        os.makedirs(dirname(modelPath))
+
+    tempPath = modelPath + '.' + str(os.getpid()) + '.tmp'
+    with open(tempPath, 'w') as modelFile:
+        json.dump(model.toDict(), modelFile, indent = 1, separators = (',', ': '), sort_keys = True)
+    os.rename(tempPath, modelPath)
+    loadedModels[modelPath] = model
+    return model
+
+
+# Function that takes as input the name of a registered model and the registry directory, and returns the
+# RegisteredModel. Each model is read once, and reused by later calls, so that a script scoring many phones
+# loads it at startup only. Raises an IOError if the model has not been registered.
+
+def loadModel(name, registryDir = None):
+    modelPath = getModelPath(name, registryDir)
+    if modelPath not in loadedModels:
+        with open(modelPath, 'r') as modelFile:
+            loadedModels[modelPath] = RegisteredModel.fromDict(json.load(modelFile))
+    return loadedModels[modelPath]
@@ -0,0 +1,88 @@
+import numpy
+from travelDiary.gpsTrace import GpsTrace, LabelColumn
+
+
+# Fields of the documents of the gpsPoints collection read to build a GpsTrace. Only the numeric fields used by
+# the inference and the ground truth labels are sent by the server.
+
+traceProjection = {'_id': 0, 'epochTime': 1, 'gpsReading.location.coordinates': 1, 'gpsReading.gpsAccuracy': 1,
+                   'groundTruth.label': 1, 'groundTruth.mode': 1}
+
+# Names of the string columns of the GpsTrace, and the ground truth fields of the documents they are read from
+
+groundTruthLabels = ['label', 'mode']
+
+# Number of documents requested from the server at a time, and converted to arrays before the next request
+
+defaultBatchSize = 10000
+
+
+# Function that takes as input a phone number, and the start and end of a time window as epoch times in
+# milliseconds, either of which may be None, and returns the query for the GPS points of that phone recorded
+# at or after startTime and before endTime
+
+def getTraceQuery(phNum, startTime = None, endTime = None):
+    query = {'phNum': phNum}
+    if startTime is not None or endTime is not None:
+        query['epochTime'] = {}
+        if startTime is not None:
+            query['epochTime']['$gte'] = startTime
+        if endTime is not None:
+            query['epochTime']['$lt'] = endTime
+    return query
+
+
+# Function that takes as input a list of documents of the gpsPoints collection, and returns a tuple containing
+# an array with one row per document, holding its epoch time, latitude, longitude and GPS accuracy, and a
+# dictionary of LabelColumns keyed by the names in groundTruthLabels. The coordinates of a point are stored as
+# [latitude, longitude] by the scripts that populate the collection.
+
+def readDocuments(documents):
+    numericColumns = numpy.empty((len(documents), 4))
+    for j in range(0, len(documents)):
+        gpsReading = documents[j]['gpsReading']
+        coordinates = gpsReading['location']['coordinates']
+        numericColumns[j] = (documents[j]['epochTime'], coordinates[0], coordinates[1], gpsReading['gpsAccuracy'])
+    labels = dict((name, LabelColumn([document.get('groundTruth', {}).get(name, '') for document in documents]))
+            for name in groundTruthLabels)
+    return numericColumns, labels
+
+
+# Function that takes as input a list of tuples returned by readDocuments, and returns the GpsTrace holding
+# the points of all the tuples, in order
+
+def joinDocuments(batches):
+    if batches:
+        numericColumns = numpy.concatenate([batch[0] for batch in batches])
+    else:
+        numericColumns = numpy.empty((0, 4))
+    labels = dict((name, LabelColumn.concatenate([batch[1][name] for batch in batches])) for name in groundTruthLabels)
+    return GpsTrace(numericColumns[:, 0], numericColumns[:, 1], numericColumns[:, 2], numericColumns[:, 3],
+            labels = labels)
+
+
+# Function that takes as input a list of documents of the gpsPoints collection, sorted by time, and returns the
+# corresponding GpsTrace
+
+def fromDocuments(documents):
+    return joinDocuments([readDocuments(documents)])
+
+
+# Function that takes as input the gpsPoints collection, a phone number and a time window, given as in
+# getTraceQuery, and returns the GPS points of that phone in the window, sorted by time, as a GpsTrace. The
+# window is applied by the server, and the documents are read in batches of batchSize, each of which is
+# converted to arrays before the next is requested, so that at most one batch of documents is held in memory.
+
+def loadGpsTrace(gpsPoints, phNum, startTime = None, endTime = None, batchSize = defaultBatchSize):
+
+    cursor = gpsPoints.find(getTraceQuery(phNum, startTime, endTime), traceProjection)
+    cursor = cursor.sort('epochTime').batch_size(batchSize)
+    batches, documents = [], []
+    for document in cursor:
+        documents.append(document)
+        if len(documents) == batchSize:
+            batches.append(readDocuments(documents))
+            documents = []
+    if documents or not batches:
+        batches.append(readDocuments(documents))
+    return joinDocuments(batches)
@@ -0,0 +1,54 @@
+import numpy
+from sklearn.neighbors import BallTree
+
+
+# Radius of the earth in meters used by MongoDB to convert angles into distances between GeoJSON points, e.g. for
+# the $maxDistance of a $nearSphere query
+
+mongoEarthRadius = 6378100
+
+
+# Class that indexes the centroids of the activities of a phone, so that the activities near each of them can
+# be found in memory, instead of with one $nearSphere query to the segments collection per activity. Centroids
+# are given as stored in the collection, and read as [longitude, latitude], as MongoDB reads GeoJSON points.
+# Distances are great-circle distances on a sphere of radius mongoEarthRadius, as computed by MongoDB, and
+# neighborhoods include the activities at a distance of exactly radius meters, as $maxDistance does.
+
+class ActivityNeighborhoods(object):
+
+    def __init__(self, centroids, durations):
+        centroids = numpy.asarray(centroids, dtype = numpy.float64).reshape(-1, 2)
+        self.points = numpy.radians(centroids[:, ::-1])
+        self.durations = list(durations)
+        self.tree = BallTree(self.points, metric = 'haversine') if len(self.durations) > 0 else None
+
+    # Function that takes as input a list of activities, as stored in the segments collection, and returns the
+    # ActivityNeighborhoods of those that have a centroid
+
+    @classmethod
+    def fromActivities(cls, activities):
+        activities = [activity for activity in activities if 'centroid' in activity]
+        return cls([activity['centroid']['coordinates'] for activity in activities],
+                [activity['duration'] for activity in activities])
+
+    def __len__(self):
+        return len(self.durations)
+
+    # Function that takes as input a list of centroids, given as stored in the segments collection, and a radius
+    # in meters, and returns for each centroid the array of the positions of the indexed activities within
+    # radius meters of it, in order of increasing distance, as they are returned by a $nearSphere query. All
+    # centroids are queried at once.
+
+    def findNeighbors(self, centroids, radius):
+        centroids = numpy.asarray(centroids, dtype = numpy.float64).reshape(-1, 2)
+        if self.tree is None:
+            return [numpy.zeros(0, dtype = numpy.int64) for k in range(0, centroids.shape[0])]
+        neighbors, distances = self.tree.query_radius(numpy.radians(centroids[:, ::-1]),
+                float(radius) / mongoEarthRadius, return_distance = True, sort_results = True)
+        return list(neighbors)
+
+    # Function that takes as input the same arguments, and returns for each centroid the total duration of the
+    # indexed activities within radius meters of it, added in the order in which findNeighbors returns them
+
+    def calDurations(self, centroids, radius):
+        return [sum(self.durations[k] for k in nearby) for nearby in self.findNeighbors(centroids, radius)]
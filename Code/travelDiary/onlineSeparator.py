@@ -0,0 +1,254 @@
+import numpy
+from travelDiary import geodesy, samplingGaps
+from travelDiary.activityCluster import ActivityCluster
+
+
+# Class that separates a stream of GPS points into trips, activities and holes, using the same algorithm and
+# parameters as inferTripActivity in tripActivity.py, but consuming the points one at a time, or in
+# small batches, as they arrive from the phone.
+#
+# Each call to addPoint or addPoints returns the list of events that have been finalized by the new points,
+# i.e. that can no longer change no matter what points arrive next. Events are returned in order of time as
+# tuples (eventType, [start, end]), where eventType is one of 'Trip', 'Activity' or 'Hole', and start and end
+# are the indices of the points where the event began and ended, counting from the first point fed to the
+# separator. Once close is called at the end of the stream, the events collected from all calls, grouped by
+# type, are identical to the trips, activities and holes returned by inferTripActivity for the same points.
+#
+# An activity is finalized once a later activity is found, or once the points being scanned are more than
+# minSeparationTime milliseconds past its end, since it can then no longer be merged with a later activity.
+# A trip is finalized once the activity that ends it is found. The gaps in the data, where trips and activities
+# are split into holes, are found as the points arrive, so that the points of a trip are not needed to emit it.
+# Only the points from the start of the collection being scanned for an activity, and the points of the last
+# activity while it can still be merged with a later one, are kept in memory, along with the indices of the gaps
+# since the start of that activity. Points must be fed in order of increasing time.
+
+class OnlineTripActivitySeparator(object):
+
+    def __init__(self, minDuration, maxRadius, minSeparationDistance,
+            minSeparationTime, minSamplingRate, gpsAccuracyThreshold):
+
+        self.minDuration, self.maxRadius = minDuration, maxRadius
+        self.minSeparationDistance, self.minSeparationTime = minSeparationDistance, minSeparationTime
+        self.minSamplingRate, self.gpsAccuracyThreshold = minSamplingRate, gpsAccuracyThreshold
+
+        # Points held in memory, where local index 0 corresponds to the point with index offset in the stream
+        self.offset, self.size = 0, 0
+        self.epochTime = numpy.zeros(64, dtype = numpy.int64)
+        self.coordinates = numpy.zeros(shape = (64, 3))
+
+        # Indices of the points recorded at least minSamplingRate milliseconds after the previous point, as
+        # returned by samplingGaps.findGaps for the stream, and epoch time of the last point received
+        self.gaps = numpy.zeros(0, dtype = numpy.int64)
+        self.lastTime = None
+
+        # State of the scan for activities, which mirrors the loop in inferTripActivity
+        self.i, self.j, self.k = 0, 0, 0
+        self.phase, self.cluster, self.closed = 'start', None, False
+
+        # Last activity found, the epoch time of its end point, and whether it has been finalized
+        self.activity, self.activityEndTime, self.activityFinal = None, None, False
+
+    # Functions that take as input the index of a point in the stream and return its epoch time and GPS accuracy
+
+    def _time(self, j):
+        return self.epochTime[j - self.offset]
+
+    def _accuracy(self, j):
+        return self.coordinates[j - self.offset, 2]
+
+    # Method that takes as input a single GPS point, and returns the list of events it finalizes
+
+    def addPoint(self, epochTime, lat, lon, accuracy):
+        return self.addPoints([epochTime], [lat], [lon], [accuracy])
+
+    # Method that takes as input arrays containing a batch of GPS points, and returns the list of events they finalize
+
+    def addPoints(self, epochTime, lat, lon, accuracy):
+
+        numPoints = len(epochTime)
+        if numPoints == 0:
+            return self._advance()
+        if self.cluster is None:
+            self._trim()
+
+        # Find the gaps in the data ending at the new points
+        epochTime = numpy.asarray(epochTime, dtype = numpy.int64)
+        if self.lastTime is None:
+            gaps = samplingGaps.findGaps(epochTime, self.minSamplingRate)
+        else:
+            gaps = samplingGaps.findGaps(numpy.concatenate(([self.lastTime], epochTime)), self.minSamplingRate) - 1
+        self.gaps = numpy.concatenate((self.gaps, gaps + self.offset + self.size))
+        self.lastTime = epochTime[-1]
+
+        if self.size + numPoints > self.epochTime.shape[0]:
+            capacity = max(2 * self.epochTime.shape[0], self.size + numPoints)
+            epochTimes, coordinates = numpy.zeros(capacity, dtype = numpy.int64), numpy.zeros(shape = (capacity, 3))
+            epochTimes[:self.size], coordinates[:self.size] = self.epochTime[:self.size], self.coordinates[:self.size]
+            self.epochTime, self.coordinates = epochTimes, coordinates
+            if self.cluster is not None:
+                self.cluster.points = self.coordinates
+
+        self.epochTime[self.size:self.size + numPoints] = epochTime
+        self.coordinates[self.size:self.size + numPoints, 0] = lat
+        self.coordinates[self.size:self.size + numPoints, 1] = lon
+        self.coordinates[self.size:self.size + numPoints, 2] = accuracy
+        self.size += numPoints
+
+        return self._advance()
+
+    # Method that signals the end of the stream, and returns the list of events that were still open
+
+    def close(self):
+
+        self.closed = True
+        events = self._advance()
+        numPoints = self.offset + self.size
+
+        if self.activity is not None:
+            if not self.activityFinal:
+                self._finalizeActivity(events)
+            if self.activity[1] < numPoints - 2:
+                self._emit('Trip', self.activity[1], numPoints - 2, events)
+        else:
+            events.append(('Trip', [0, numPoints - 1]))
+
+        return events
+
+    # Procedure that splits the event from start to end at holes in the data, and appends the pieces
+    # and the holes to the list of events in order of time
+
+    def _emit(self, eventType, start, end, events):
+        pieces, holes = [], []
+        samplingGaps.inferHoles(start, end, pieces, holes, self.gaps)
+        pieces = [(eventType, piece) for piece in pieces]
+        holes = [('Hole', hole) for hole in holes]
+        events.extend(sorted(pieces + holes, key = lambda event: event[1][0]))
+
+    def _finalizeActivity(self, events):
+        self._emit('Activity', self.activity[0], self.activity[1], events)
+        self.activityFinal = True
+
+    # Procedure that drops the points that are no longer needed by the scan or by the last activity, and the
+    # gaps that precede the start of the last activity, before which no event is emitted any more
+
+    def _trim(self):
+        keep = min(self.i, self.offset + self.size)
+        if self.activity is not None:
+            self.gaps = self.gaps[numpy.searchsorted(self.gaps, self.activity[0] + 1):]
+            if not self.activityFinal:
+                keep = min(keep, self.activity[0])
+        drop = keep - self.offset
+        if drop > 0 and 2 * drop >= self.size:
+            self.epochTime[:self.size - drop] = self.epochTime[drop:self.size]
+            self.coordinates[:self.size - drop] = self.coordinates[drop:self.size]
+            self.offset, self.size = keep, self.size - drop
+
+    # Method that continues the scan for activities as far as the points received so far allow, and returns
+    # the list of events finalized along the way. Whenever the scan needs a point that has not arrived yet,
+    # its state is saved and the method returns.
+
+    def _advance(self):
+
+        events = []
+        numPoints = self.offset + self.size
+        while self.phase != 'done':
+
+            if self.phase == 'start':
+                if self.i >= numPoints - 1:
+                    if self.closed:
+                        self.phase = 'done'
+                    return events
+                self.phase = 'skip'
+
+            # Skip over any black points at the beginning
+            if self.phase == 'skip':
+                while self._accuracy(self.i) >= self.gpsAccuracyThreshold:
+                    if self.i < numPoints - 1:
+                        self.i += 1
+                    elif self.closed:
+                        break
+                    else:
+                        return events
+                self.j = self.i + 1
+                self.cluster = ActivityCluster(self.coordinates, self.i - self.offset, self.maxRadius)
+                self.phase = 'grow'
+
+            # Create a collection of successive points that lie within a circle of radius maxRadius meters, such that no
+            # two consecutive points in space are separated by more than minSamplingRate milliseconds
+            if self.phase == 'grow':
+                while True:
+                    if self.j >= numPoints:
+                        if self.closed:
+                            break
+                        return events
+                    if (self._accuracy(self.j) < self.gpsAccuracyThreshold
+                            and self._time(self.j) - self._time(self.j - 1) < self.minSamplingRate
+                            and self.cluster.fits(self.j - self.offset)):
+                        self.cluster.add()
+                        self.j += 1
+                    else:
+                        break
+                self.k = self.j
+                self.phase = 'black'
+
+            # Check for black points
+            if self.phase == 'black':
+                while True:
+                    if self.k >= numPoints:
+                        if self.closed:
+                            break
+                        return events
+                    if self._accuracy(self.k) >= self.gpsAccuracyThreshold:
+                        self.k += 1
+                    else:
+                        break
+                if self.k > self.j and self.k < numPoints and self.cluster.fits(self.k - self.offset):
+                    self.j = self.k + 1
+                self._decide(events)
+                if self.k == numPoints:
+                    self.phase = 'done'
+                    return events
+                self._trim()
+
+        return events
+
+    # Procedure that checks whether the collection of points from i to j - 1 is an activity, and updates the
+    # list of events accordingly
+
+    def _decide(self, events):
+
+        i, j = self.i, self.j
+        if self._time(j - 1) - self._time(i) > self.minDuration:
+
+            # Check if the activity is separated in space from previous activity by at least minSeparationDistance meters
+            # and separated in time by minSeparationTime milliseconds
+            if (self.activity is not None and self._time(j - 1) - self.activityEndTime < self.minSeparationTime
+                    and self._distanceToActivity(i, j - 1) < self.minSeparationDistance):
+                self.activity[1], self.activityEndTime = j - 1, self._time(j - 1)
+            else:
+                if self.activity is None:
+                    if i != 0:
+                        self._emit('Trip', 0, i, events)
+                else:
+                    if not self.activityFinal:
+                        self._finalizeActivity(events)
+                    self._emit('Trip', self.activity[1], i, events)
+                self.activity, self.activityEndTime, self.activityFinal = [i, j - 1], self._time(j - 1), False
+            self.i = j - 1
+        else:
+            self.i += 1
+
+        self.cluster, self.phase = None, 'start'
+
+        # The last activity can no longer be extended once the scan has moved minSeparationTime milliseconds past it
+        if (self.activity is not None and not self.activityFinal
+                and self._time(self.i) - self.activityEndTime >= self.minSeparationTime):
+            self._finalizeActivity(events)
+
+    # Function that outputs the distance, in meters, between the median point of the last activity and the
+    # median point of the collection of points from start to end - 1
+
+    def _distanceToActivity(self, start, end):
+        points1 = self.coordinates[self.activity[0] - self.offset:self.activity[1] - self.offset, 0:2]
+        points2 = self.coordinates[start - self.offset:end - self.offset, 0:2]
+        return geodesy.calDistance(numpy.median(points1, axis = 0), numpy.median(points2, axis = 0))
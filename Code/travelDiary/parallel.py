@@ -0,0 +1,33 @@
+import multiprocessing
+import traceback
+
+
+# Function that takes as input a tuple containing a function and its argument, and returns a tuple containing
+# the result of the call and None, or None and the traceback of the exception raised by the call
+
+def callSafely(task):
+    function, argument = task
+    try:
+        return function(argument), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+# Function that takes as input a function, a list of arguments and the number of worker processes, and calls
+# the function on each argument. Output is a list of (result, error) tuples in the same order as the arguments,
+# where error is the traceback of any exception raised by that call, and None otherwise, so that the caller
+# can report failures and reduce the results in a fixed order, whatever the number of workers. With a single
+# worker the calls are made in the current process.
+#
+# The function must be defined at the top level of a module, so that it can be sent to the worker processes.
+
+def mapTasks(function, arguments, numWorkers = 1):
+    tasks = [(function, argument) for argument in arguments]
+    if numWorkers <= 1 or len(tasks) <= 1:
+        return [callSafely(task) for task in tasks]
+    pool = multiprocessing.Pool(min(numWorkers, len(tasks)))
+    try:
+        return pool.map(callSafely, tasks, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,124 @@
+import numpy
+from travelDiary import geodesy
+from travelDiary.segments import SegmentAggregates, calPrefixSums
+
+
+# Class that stores the features of every point of a range of GPS points, ordered in terms of increasing time,
+# computed once for the whole range with array operations instead of once per point and feature by the
+# lengthPoint, timePoint, speedPoint, accelerationPoint and headingChange functions of the inference scripts,
+# which compute each haversine distance three to four times. The values are identical to those returned by
+# these functions.
+#
+# The range starts at point start of the trace, and features are looked up by the index of the point in the
+# trace. For point j, with k = j - start:
+#
+#   distance[k]      distance in meters to point j + 1
+#   time[k]          time interval in seconds to point j + 1
+#   speed[k]         speed in mph from point j to point j + 1
+#   bearing[k]       bearing in degrees from point j to point j + 1
+#   acceleration[k]  change in speed (in mph per hour) between the legs (j, j + 1) and (j + 1, j + 2)
+#   headingChange[k] absolute change in bearing in degrees between the same legs
+#   speedChange[k]   change in speed between the same legs relative to the speed over the first leg
+#
+# The first four arrays have one element fewer than the range, and the last three two fewer. Where two
+# successive points were recorded at the same time, features that divide by that interval are infinite or NaN,
+# where the per-point functions raised a ZeroDivisionError, and so is the relative change in speed where the
+# speed over the first leg is zero.
+
+class PointFeatures(object):
+
+    def __init__(self, distance, time, speed, bearing, start = 0):
+
+        self.start = start
+        self.distance, self.time, self.speed, self.bearing = distance, time, speed, bearing
+        self.headingChange = numpy.fabs(self.bearing[:-1] - self.bearing[1:])
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            speedDifference = numpy.abs(self.speed[1:] - self.speed[:-1])
+            self.acceleration = speedDifference / (self.time[:-1] / 3600.0)
+            self.speedChange = speedDifference / self.speed[:-1]
+
+        # Points whose speed, acceleration and heading change are defined, i.e. for which determineFeatures
+        # returns rather than raising a ZeroDivisionError, and the number of points before each point that are not
+        self.isDefined = numpy.isfinite(self.acceleration)
+        self.numUndefined = calPrefixSums(~self.isDefined)
+        self._aggregates = {}
+
+    # Function that returns the number of points for which all features are computed
+
+    def __len__(self):
+        return self.headingChange.shape[0]
+
+    # Function that takes as input the latitudes, longitudes and epoch times of a range of points, and the index
+    # of the first of these points, and returns their PointFeatures
+
+    @classmethod
+    def fromCoordinates(cls, lat, lon, epochTime, start = 0):
+        lat = numpy.asarray(lat, dtype = numpy.float64)
+        lon = numpy.asarray(lon, dtype = numpy.float64)
+        epochTime = numpy.asarray(epochTime, dtype = numpy.float64)
+        distance = geodesy.calDistancesExact(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        time = numpy.diff(epochTime) / 1000.0
+        bearing = geodesy.calBearingsExact(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        return cls(distance, time, geodesy.calSpeeds(distance, time), bearing, start)
+
+    # Function that takes as input a GpsTrace and the indices of the first and last point of a range, and returns
+    # the PointFeatures of the points start, ..., end - 1. The distances, times, speeds and bearings are slices
+    # of the derived columns cached on the trace.
+
+    @classmethod
+    def fromTrace(cls, gpsTraces, start = 0, end = None):
+        if end is None:
+            end = len(gpsTraces)
+        steps = [gpsTraces.derived(name)[start:end - 1] for name in ['stepDistance', 'stepTime', 'speed', 'bearing']]
+        return cls(*steps, start = start)
+
+    # Function that takes as input the indices of the first and last point of a range of points, and returns a
+    # dictionary holding the features of the points start, ..., end - 1, keyed by attribute name. Raises an
+    # IndexError if the features of any of these points are not computed, and a ZeroDivisionError if they are
+    # not defined, like the per-point functions would when called for each of these points.
+
+    def getRange(self, start, end):
+        first, last = self.checkRange(start, end)
+        names = ['distance', 'time', 'speed', 'bearing', 'acceleration', 'headingChange', 'speedChange']
+        return dict((name, getattr(self, name)[first:last]) for name in names)
+
+    # Function that takes as input the indices of the first and last point of a range of points, and returns
+    # the positions of the points start and end in the feature arrays. Raises the errors described for getRange,
+    # in time independent of the length of the range.
+
+    def checkRange(self, start, end):
+        first, last = start - self.start, end - self.start
+        if first < 0 or last > len(self):
+            raise IndexError('Features of points %d to %d are not computed' % (start, end - 1))
+        if last > first and self.numUndefined[last] != self.numUndefined[first]:
+            raise ZeroDivisionError('Points %d to %d include a zero time interval' % (start, end - 1))
+        return first, last
+
+    # Function that returns the SegmentAggregates of the feature name, e.g. 'speed', built on first use and
+    # cached, from which the sums, counts and largest values of the feature over a mode chain are read
+
+    def aggregates(self, name):
+        if name not in self._aggregates:
+            self._aggregates[name] = SegmentAggregates(getattr(self, name), self.start)
+        return self._aggregates[name]
+
+    # Function that returns an array with one row per point for which all features are computed, containing
+    # the three features used by the walk/non-walk decision tree: speed, acceleration and heading change
+
+    def walkFeatures(self):
+        return numpy.column_stack((self.speed[:-1], self.acceleration, self.headingChange))
+
+    # Function that labels each point for which all features are computed as a walk point if its speed is below
+    # maxWalkSpeed and its acceleration below maxWalkAcceleration, the rule used instead of the decision tree by
+    # generateNotifications.py and modeInferenceDecisionTree.py. Returns two boolean arrays, holding the labels
+    # and whether the label of each point is not defined, which is the case where its speed is not defined, as
+    # the next point was recorded at the same time, or where its speed is below maxWalkSpeed and its
+    # acceleration is not defined, as the rule only compares the acceleration of points slower than
+    # maxWalkSpeed.
+
+    def walkRule(self, maxWalkSpeed, maxWalkAcceleration):
+        speed = self.speed[:-1]
+        with numpy.errstate(invalid = 'ignore'):
+            isSlow = speed < maxWalkSpeed
+            isWalk = isSlow & (self.acceleration < maxWalkAcceleration)
+        return isWalk, ~numpy.isfinite(speed) | (isSlow & ~self.isDefined)
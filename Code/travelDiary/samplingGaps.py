@@ -0,0 +1,29 @@
+import numpy
+
+
+# Function that takes as input an array of epoch times, in milliseconds and in order of increasing time, and the
+# threshold for labelling a gap in the data a hole, and returns the sorted array of the indices j of the points
+# recorded at least minSamplingRate milliseconds after point j - 1. Computed once per GPS log, with one diff
+# over the epoch times, and shared by all the calls to inferHoles for that log.
+
+def findGaps(epochTime, minSamplingRate):
+    epochTime = numpy.asarray(epochTime)
+    return numpy.flatnonzero(numpy.diff(epochTime) >= minSamplingRate) + 1
+
+
+# Procedure that takes as input the start and end points to an event, the list of events and holes, and the
+# array of gaps in the data returned by findGaps, and infers holes in the data and splits the event accordingly
+# into multiple events. The gaps within the event are found with a binary search, and each gap at point j adds
+# the hole [j - 1, j], after the piece of the event that ends at point j - 1, if any. Events and holes are
+# appended in order of time, as by the point-by-point scan of the epoch times this replaces.
+
+def inferHoles(eventStart, eventEnd, events, holes, gaps):
+    first, last = numpy.searchsorted(gaps, [eventStart + 1, eventEnd + 1])
+    for gap in gaps[first:last]:
+        gap = int(gap)
+        holes.append([gap - 1, gap])
+        if gap - 1 > eventStart:
+            events.append([eventStart, gap - 1])
+        eventStart = gap
+    if eventStart < eventEnd:
+        events.append([eventStart, eventEnd])
@@ -0,0 +1,135 @@
+import numpy
+from travelDiary import geodesy
+
+
+# Function that takes as input an array of labels, and returns the positions at which the runs of equal
+# consecutive labels begin, and the label of each run
+
+def runLengthEncode(labels):
+    labels = numpy.asarray(labels)
+    if labels.shape[0] == 0:
+        return numpy.zeros(0, dtype = numpy.int64), labels
+    starts = numpy.flatnonzero(numpy.concatenate(([True], labels[1:] != labels[:-1])))
+    return starts, labels[starts]
+
+
+# Function that takes as input the GpsTrace containing GPS data and the indices of two points, and returns the
+# average speed in mph between them, computed from the distance between the two points and the time elapsed.
+# Raises a ZeroDivisionError if both points were recorded at the same time.
+
+def calSegmentSpeed(gpsTraces, start, end):
+    distance = geodesy.calDistance(gpsTraces.latLon(start), gpsTraces.latLon(end))
+    time = gpsTraces.segmentTime(start, end)
+    return geodesy.mphPerMps * (float(distance) / time)
+
+
+# Function that carries out Step 1 of inferModeChain, labelling each GPS point of a trip as a walk point (1)
+# or a non-walk point (0). Takes as input the GpsTrace containing GPS data, a tuple containing the indices of
+# the start and end point of the trip, and two boolean arrays over the points trip[0], trip[0] + 1, ..., as
+# computed from the PointFeatures of the trip: isWalk, the label of each point given by the walk/non-walk
+# classifier of the calling script, and isUndefined, whether that label could not be computed because of a
+# zero time interval. Returns a uint8 array holding the labels of the points trip[0], ..., trip[1] - 1.
+#
+# A point is labelled by the classifier unless its GPS accuracy, or that of either of the next two points,
+# exceeds gpsAccuracyThreshold. Each run of such points is instead labelled by comparing the average speed
+# between its first point and the point following the run against maxWalkSpeed.
+#
+# Raises the error the point-by-point loop this replaces would have raised first: a ZeroDivisionError for a
+# point, or a run of points, whose speed is not defined, and an IndexError if the accuracy of the point after
+# the end of the trace is needed.
+
+def labelWalkPoints(gpsTraces, trip, isWalk, isUndefined, maxWalkSpeed, gpsAccuracyThreshold):
+
+    start, end = trip[0], trip[1]
+    numLabels, numPoints = end - start, len(gpsTraces)
+    errors = []
+
+    # Points whose GPS accuracy, or that of either of the next two points, exceeds gpsAccuracyThreshold
+    isBlack = numpy.ones(numLabels + 2, dtype = bool)
+    isBlack[:min(end + 2, numPoints) - start] = gpsTraces.accuracy[start:end + 2] > gpsAccuracyThreshold
+    isMasked = isBlack[:numLabels] | isBlack[1:numLabels + 1] | isBlack[2:]
+    if end + 2 > numPoints and not isBlack[numLabels - 1] and not isBlack[numLabels]:
+        errors.append((end - 1, 0, IndexError('GPS accuracy of point %d is not available' % (end + 1))))
+
+    # Points labelled by the classifier
+    isPoint = ~isMasked
+    isWalk = numpy.concatenate((isWalk[:numLabels], numpy.zeros(max(0, numLabels - len(isWalk)), dtype = bool)))
+    isUndefined = numpy.concatenate((isUndefined[:numLabels],
+            numpy.zeros(max(0, numLabels - len(isUndefined)), dtype = bool)))
+    undefined = numpy.flatnonzero(isPoint & isUndefined)
+    if undefined.shape[0] > 0:
+        errors.append((start + undefined[0], 2, ZeroDivisionError('Zero time interval at point %d' % (start + undefined[0]))))
+
+    # Runs of points labelled by the average speed over the run
+    runStarts, runValues = runLengthEncode(isMasked)
+    runLengths = numpy.diff(numpy.append(runStarts, numLabels))
+    blockStarts, blockEnds = runStarts[runValues] + start, runStarts[runValues] + runLengths[runValues] + start
+    times = (gpsTraces.epochTime[blockEnds] - gpsTraces.epochTime[blockStarts]) / 1000.0
+    if numpy.any(times == 0):
+        block = numpy.argmax(times == 0)
+        errors.append((blockEnds[block], 1, ZeroDivisionError('Zero time interval at points %d to %d'
+                % (blockStarts[block], blockEnds[block]))))
+
+    if errors:
+        raise min(errors, key = lambda error: error[:2])[2]
+
+    distances = geodesy.calDistancesExact(gpsTraces.lat[blockStarts], gpsTraces.lon[blockStarts],
+            gpsTraces.lat[blockEnds], gpsTraces.lon[blockEnds])
+    runLabels = numpy.zeros(runStarts.shape[0], dtype = bool)
+    runLabels[runValues] = geodesy.calSpeeds(distances, times) < maxWalkSpeed
+    labels = numpy.repeat(runLabels, runLengths)
+    labels[isPoint] = isWalk[isPoint]
+    return labels.astype(numpy.uint8)
+
+
+# Function that carries out Steps 2 to 5 of inferModeChain. Takes as input the GpsTrace containing GPS data,
+# a tuple containing the indices of the start and end point of a trip, and the labels returned by
+# labelWalkPoints, and returns the mode chain of the trip, as a list of segments [start, end, walk], where
+# walk is 1 for a walk segment and 0 for a non-walk segment.
+#
+# Step 2: Identify walk and non-walk segments as consecutive walk or non-walk points.
+#
+# Step 3: If the time span of a segment is greater than minSegmentDuration milliseconds, label it as certain.
+# If it is less than minSegmentDuration milliseconds, and its backward segment is certain, merge it with the
+# backward segment. If no certain backward segment exists, label the segment as uncertain, and save it as an
+# independent segment. Segments are therefore uncertain exactly when they precede the first certain segment.
+#
+# Step 4: Merge consecutive uncertain segments into a single certain segment. Calculate average speed over
+# segment and compare it against maxWalkSpeed to determine whether walk or non-walk. Check if this segment
+# exceeds minSegmentDuration milliseconds. If it doesn't, and there exists a certain forward segment, merge
+# the new segment with this forward segment.
+#
+# Step 5: Merge consecutive walk segments and consecutive non-walk segments.
+
+def inferSegments(gpsTraces, trip, walkLabels, maxWalkSpeed, minSegmentDuration):
+
+    # Step 2
+    starts, labels = runLengthEncode(walkLabels)
+    starts = starts + trip[0]
+    ends = numpy.append(starts[1:], trip[1])
+
+    # Step 3
+    epochTime = gpsTraces.epochTime
+    isCertain = epochTime[ends] - epochTime[starts] >= minSegmentDuration
+    firstCertain = numpy.argmax(isCertain) if isCertain.any() else isCertain.shape[0]
+    isKept = isCertain | (numpy.arange(isCertain.shape[0]) < firstCertain)
+    starts, labels, isCertain = starts[isKept], labels[isKept], isCertain[isKept]
+    ends = numpy.append(starts[1:], ends[-1])
+
+    # Step 4
+    first = max(1, firstCertain)
+    firstSegment = [starts[0], ends[first - 1], labels[0]]
+    if first > 1:
+        firstSegment[2] = int(calSegmentSpeed(gpsTraces, firstSegment[0], firstSegment[1]) < maxWalkSpeed)
+    segments = [firstSegment]
+    if first < len(starts) and not isCertain[0]:
+        if epochTime[firstSegment[1]] - epochTime[firstSegment[0]] < minSegmentDuration:
+            starts[first] = trip[0]
+            segments = []
+    segments += [[starts[i], ends[i], labels[i]] for i in range(first, len(starts))]
+
+    # Step 5
+    runStarts, runLabels = runLengthEncode([segment[2] for segment in segments])
+    runEnds = numpy.append(runStarts[1:], len(segments)) - 1
+    return [[int(segments[i][0]), int(segments[j][1]), int(label)]
+            for i, j, label in zip(runStarts, runEnds, runLabels)]
@@ -0,0 +1,142 @@
+import numpy
+
+
+# Function that takes as input an array, and returns the array of its prefix sums, with a leading zero, so that
+# the sum of the elements start, ..., end - 1 is prefix[end] - prefix[start]
+
+def calPrefixSums(values):
+    return numpy.concatenate(([0], numpy.cumsum(values)))
+
+
+# Class that answers queries about a segment of an array of per-point values, e.g. the speeds of the points
+# of a trace, in time independent of the length of the segment. Segments are given by the indices start and
+# end of the points of the trace, and cover the points start, ..., end - 1. The array may describe a range of
+# points of the trace starting at point offset, as the arrays of PointFeatures do.
+#
+# Sums, means and variances are computed from prefix sums, in O(1) per segment. They are equal to the sum of
+# the values in the segment up to round-off, but not necessarily identical to the sum computed by a loop over
+# the segment. Sums of integer values, such as times in milliseconds, are exact, and so are sums of segments
+# whose values are all zero. The variance is computed from the prefix sums of the values shifted by their mean,
+# to limit its round-off. Segments that contain infinite or NaN values are summed directly from the values, so
+# that such a value only affects the segments that contain it.
+#
+# The numbers of values below or above a threshold are computed from prefix counts, in O(1) per segment once
+# the counts for that threshold have been built, which is done on first use and cached, as the inference
+# scripts use a fixed set of thresholds. The k largest values are found with a sparse table of the k largest
+# values of every block of 2^m points, in O(k) per segment, and the table is built on first use.
+
+class SegmentAggregates(object):
+
+    def __init__(self, values, offset = 0, k = 3):
+
+        self.values = numpy.asarray(values, dtype = numpy.float64)
+        self.offset, self.k = offset, k
+
+        isFinite = numpy.isfinite(self.values)
+        finiteValues = self.values[isFinite]
+        self.sums = calPrefixSums(numpy.where(isFinite, self.values, 0.0))
+        shift = numpy.mean(finiteValues) if finiteValues.shape[0] > 0 else 0.0
+        shifted = numpy.where(isFinite, self.values - shift, 0.0)
+        self.shiftedSums, self.shiftedSquares = calPrefixSums(shifted), calPrefixSums(shifted * shifted)
+        self.numNonFinite = calPrefixSums(~isFinite)
+
+        self.counts = {}
+        self.topTable = None
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    # Function that converts the indices of the points at the ends of a segment to positions in the array
+
+    def _positions(self, start, end):
+        first, last = start - self.offset, end - self.offset
+        if first < 0 or last > len(self) or last < first:
+            raise IndexError('Values of points %d to %d are not computed' % (start, end - 1))
+        return first, last
+
+    # Functions that take as input the indices of the points at the ends of a segment, and return the number
+    # of values, and their sum, mean and (population) variance. The mean and variance of an empty segment
+    # are NaN.
+
+    def count(self, start, end):
+        first, last = self._positions(start, end)
+        return last - first
+
+    def sum(self, start, end):
+        first, last = self._positions(start, end)
+        if self.numNonFinite[last] != self.numNonFinite[first]:
+            return float(numpy.sum(self.values[first:last]))
+        return float(self.sums[last] - self.sums[first])
+
+    def mean(self, start, end):
+        numValues = self.count(start, end)
+        if numValues == 0:
+            return float('nan')
+        return self.sum(start, end) / numValues
+
+    def variance(self, start, end):
+        first, last = self._positions(start, end)
+        if last == first:
+            return float('nan')
+        if self.numNonFinite[last] != self.numNonFinite[first]:
+            return float(numpy.var(self.values[first:last]))
+        numValues = last - first
+        mean = (self.shiftedSums[last] - self.shiftedSums[first]) / numValues
+        return float(max(0.0, (self.shiftedSquares[last] - self.shiftedSquares[first]) / numValues - mean * mean))
+
+    # Functions that take as input a threshold and the indices of the points at the ends of a segment, and
+    # return the number of values in the segment that are below or above the threshold. NaN values are
+    # neither below nor above any threshold.
+
+    def countBelow(self, threshold, start, end):
+        return self._count('below', threshold, start, end)
+
+    def countAbove(self, threshold, start, end):
+        return self._count('above', threshold, start, end)
+
+    def _count(self, side, threshold, start, end):
+        first, last = self._positions(start, end)
+        if (side, threshold) not in self.counts:
+            with numpy.errstate(invalid = 'ignore'):
+                isCounted = self.values < threshold if side == 'below' else self.values > threshold
+            self.counts[(side, threshold)] = calPrefixSums(isCounted)
+        counts = self.counts[(side, threshold)]
+        return int(counts[last] - counts[first])
+
+    # Function that takes as input the indices of the points at the ends of a segment, and returns the list
+    # of the k largest values in the segment, in decreasing order, or of all its values if it has fewer
+    # than k. NaN values are ranked below all other values.
+
+    def topK(self, start, end):
+        first, last = self._positions(start, end)
+        if last == first:
+            return []
+        if self.topTable is None:
+            self._buildTopTable()
+        level = int(last - first).bit_length() - 1
+        candidates = numpy.union1d(self.topTable[level][first], self.topTable[level][last - (1 << level)])
+        candidates = candidates[candidates >= 0]
+        order = numpy.argsort(-self.rankKeys[candidates], kind = 'mergesort')
+        return [float(value) for value in self.values[candidates[order[:self.k]]]]
+
+    # Procedure that builds the sparse table used by topK. Level m of the table holds, for every position i,
+    # the positions of the k largest values of the block i, ..., i + 2^m - 1, padded with -1 if the block is
+    # shorter than k or runs past the end of the array.
+
+    def _buildTopTable(self):
+
+        self.rankKeys = numpy.where(numpy.isnan(self.values), -numpy.inf, self.values)
+        numValues = len(self)
+        level = numpy.full((numValues, self.k), -1, dtype = numpy.int32)
+        level[:, 0] = numpy.arange(numValues)
+        self.topTable = [level]
+
+        width = 1
+        while 2 * width <= numValues:
+            right = numpy.full((numValues, self.k), -1, dtype = numpy.int32)
+            right[:numValues - width] = level[width:]
+            candidates = numpy.concatenate((level, right), axis = 1)
+            order = numpy.lexsort((-self.rankKeys[candidates], candidates < 0), axis = 1)[:, :self.k]
+            level = numpy.take_along_axis(candidates, order, axis = 1)
+            self.topTable.append(level)
+            width *= 2
@@ -0,0 +1,68 @@
+import dateutil.parser
+import numpy
+
+
+# Lengths in seconds of the time-of-day buckets and of a day, and the numbers of buckets in a day and a week
+
+secondsPerBucket, secondsPerDay = 10800, 86400
+bucketsPerDay, daysPerWeek = 8, 7
+
+# Days of the week counted as week days, weekend days and Fridays by the day-of-week features, numbered as by
+# datetime.weekday, i.e. from Monday = 0 to Sunday = 6
+
+weekDays, weekEnds, fridays = [0, 1, 2, 3, 4], [5, 6], [4]
+
+
+# Function that takes as input a list of timestamps, e.g. the start or end times of the segments of a phone,
+# and returns the list of the corresponding datetimes, parsing each distinct timestamp once
+
+def parseTimes(timestamps):
+    parsed = {}
+    for timestamp in timestamps:
+        if timestamp not in parsed:
+            parsed[timestamp] = dateutil.parser.parse(timestamp)
+    return [parsed[timestamp] for timestamp in timestamps]
+
+
+# Function that takes as input lists of the start and end datetimes of segments and the length of a step in
+# seconds, and returns the array of the number of times start, start + step, start + 2 * step, ... that are
+# earlier than the end of each segment, i.e. the number of iterations of a loop stepping from its start to its
+# end. Times are compared as instants, as datetimes with time zones are.
+
+def calNumSteps(startTimes, endTimes, stepSeconds):
+    durations = [endTime - startTime for startTime, endTime in zip(startTimes, endTimes)]
+    microseconds = numpy.array([(duration.days * secondsPerDay + duration.seconds) * 1000000 + duration.microseconds
+            for duration in durations], dtype = numpy.int64)
+    return numpy.maximum(0, -(-microseconds // (stepSeconds * 1000000)))
+
+
+# Function that takes as input arrays of the bucket of the first step of each segment and of its number of
+# steps, where each step moves on to the next of numBuckets buckets, wrapping around after the last, and
+# returns a matrix with one row per segment holding the number of steps that fall in each bucket
+
+def calCyclicCounts(firstBuckets, numSteps, numBuckets):
+    firstBuckets = numpy.asarray(firstBuckets, dtype = numpy.int64).reshape(-1, 1)
+    numSteps = numpy.asarray(numSteps, dtype = numpy.int64).reshape(-1, 1)
+    offsets = (numpy.arange(numBuckets) - firstBuckets) % numBuckets
+    return (numSteps // numBuckets + (offsets < numSteps % numBuckets)).astype(numpy.float64)
+
+
+# Function that takes as input lists of the start and end datetimes of segments, and returns a matrix with one
+# row per segment holding the number of times its start time, stepped forward by three hours at a time until
+# the end time, falls in each of the eight three-hour periods of the day, from midnight. As stepping forward
+# by three hours moves on to the next period, the counts follow from the period of the start time and the
+# number of steps.
+
+def calTimeOfDay(startTimes, endTimes):
+    firstBuckets = [startTime.hour / (secondsPerBucket / 3600) for startTime in startTimes]
+    return calCyclicCounts(firstBuckets, calNumSteps(startTimes, endTimes, secondsPerBucket), bucketsPerDay)
+
+
+# Function that takes as input lists of the start and end datetimes of segments, and returns a matrix with one
+# row per segment holding the number of times its start time, stepped forward by a day at a time until the end
+# time, falls on a week day, on a weekend day and on a Friday
+
+def calDayOfWeek(startTimes, endTimes):
+    firstDays = [startTime.weekday() for startTime in startTimes]
+    counts = calCyclicCounts(firstDays, calNumSteps(startTimes, endTimes, secondsPerDay), daysPerWeek)
+    return numpy.column_stack([counts[:, days].sum(axis = 1) for days in [weekDays, weekEnds, fridays]])
@@ -0,0 +1,36 @@
+import numpy
+from travelDiary import loader, mongoLoader
+from travelDiary.gpsTrace import GpsTrace, labelColumns
+
+
+# Function that takes as input a list of lists containing GPS data, where each element of the list corresponds
+# to a row in the tab-delimited GPS data file, as produced by parseCSV, or in the data returned by the tracking
+# server, and returns the corresponding GpsTrace. The epoch time, latitude, longitude and GPS accuracy in the
+# second to fifth columns must be numeric. The battery status and sampling rate in the sixth and seventh columns
+# are read where they are numbers, and are otherwise NaN and zero respectively, as the rows returned by the
+# server need not hold numbers there. The string columns named in labelColumns are read from the ninth column
+# onwards, and are empty for the rows that end before them.
+
+def fromRows(rows):
+    columns = numpy.array([row[1:5] for row in rows], dtype = numpy.float64).reshape(len(rows), 4)
+    battery = loader.parseNumericColumn(rows, 5)
+    samplingRate = numpy.nan_to_num(loader.parseNumericColumn(rows, 6))
+    labels = {}
+    for k in range(0, len(labelColumns)):
+        labels[labelColumns[k]] = [row[8 + k] if len(row) > 8 + k else '' for row in rows]
+    return GpsTrace(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3], battery, samplingRate, labels)
+
+
+# Function that returns its input unchanged if it is already a GpsTrace, and otherwise converts the GPS data
+# of a phone into a GpsTrace, whatever it was read from: a list of documents of the gpsPoints collection, which
+# are dictionaries holding the coordinates of a point as [latitude, longitude], or the list of lists read from
+# a GPS data file or returned by the tracking server, holding the latitude and longitude of a point in its
+# third and fourth columns. The inference in the package and the scripts read GPS data through this function
+# only, so that it runs alike on data from either source.
+
+def asGpsTrace(gpsTraces):
+    if isinstance(gpsTraces, GpsTrace):
+        return gpsTraces
+    if len(gpsTraces) > 0 and isinstance(gpsTraces[0], dict):
+        return mongoLoader.fromDocuments(gpsTraces)
+    return fromRows(gpsTraces)
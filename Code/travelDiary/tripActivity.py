@@ -0,0 +1,126 @@
+import numpy
+from travelDiary import geodesy, samplingGaps
+from travelDiary.activityCluster import ActivityCluster
+from travelDiary.localProjection import LocalProjection
+from travelDiary.medians import PointMedian
+from travelDiary.traces import asGpsTrace
+
+
+# Function that takes as input the PointMedian of the points of an activity, the index of the end point of the
+# activity, and an array of points, where a point is a row containing its latitude, longitude and GPS accuracy.
+# The function outputs the distance, in meters, between the median point of the activity and the median point
+# in the array. The median of the activity is updated with the points added to it since the last call, rather
+# than recomputed from all its points.
+
+def calDistanceBetweenPoints(activityMedian, activityEnd, points):
+    point2 = numpy.median(points[:, 0:2], axis = 0)
+    return geodesy.calDistance(activityMedian.median(activityEnd), point2)
+
+
+# Function that takes as input the list of activities, as tuples of the indices of their start and end points,
+# the number of GPS points and the array of gaps in the data returned by samplingGaps.findGaps, and imputes
+# the trips between the activities and splits trips and activities at the holes in the data. Output is a tuple
+# containing the trips, activities and holes.
+
+def separateEvents(activities, numPoints, gaps):
+
+    trips, newActivities, holes = [], [], []
+
+    # If the data comprises a single trip
+    if len(activities) == 0:
+        trips.append([0, numPoints - 1])
+        return trips, newActivities, holes
+
+    # Check if the GPS log begins with a trip
+    if activities[0][0] != 0:
+        samplingGaps.inferHoles(0, activities[0][0], trips, holes, gaps)
+
+    # Interpolate trips from activities and identify holes in activities
+    for i in range(0, len(activities) - 1):
+        samplingGaps.inferHoles(activities[i][0], activities[i][1], newActivities, holes, gaps)
+        samplingGaps.inferHoles(activities[i][1], activities[i + 1][0], trips, holes, gaps)
+
+    # Identify holes in the last activity
+    samplingGaps.inferHoles(activities[-1][0], activities[-1][1], newActivities, holes, gaps)
+
+    # Check if the GPS log ends with a trip
+    if activities[-1][-1] < numPoints - 2:
+        samplingGaps.inferHoles(activities[-1][1], numPoints - 2, trips, holes, gaps)
+    return trips, newActivities, holes
+
+
+# Method that takes as input the GPS data of a phone, called gpsTraces, as a GpsTrace, a list of documents read
+# from the gpsPoints collection or a list of lists read from a GPS data file, ordered in terms of increasing time,
+# and separates the GPS points into trips and activities. Output is a tuple containing the trips, activities
+# and holes.
+#
+# Each element of trips is a tuple and corresponds to a particular trip. The elements of the tuple are the
+# indices of the corresponding GPS data points in gpsTraces for where the trip began and ended, respectively.
+# Similarly, each element of activities is a tuple and corresponds to a particular activity. The elements
+# of the tuple are the indices of the corresponding GPS data point in gpsTraces for where the activity began
+# and ended, respectively.
+#
+# An activity is defined as a set of GPS points over a minimum duration of minDuration milliseconds that fall within
+# a circle of radius maxRadius meters. Successive activities less than minSeparationDistance meters and
+# minSeparationTime milliseconds apart are merged into a single activity.
+#
+# GPS traces whose accuracy is above gpsAccuracyThreshold meters are ignored.
+
+def inferTripActivity(gpsTraces, minDuration, maxRadius, minSeparationDistance,
+        minSeparationTime, minSamplingRate, gpsAccuracyThreshold):
+
+    gpsTraces = asGpsTrace(gpsTraces)
+    activities = []
+    activityMedian = None
+    coordinates = gpsTraces.coordinates()
+    projection = LocalProjection(gpsTraces.lat, gpsTraces.lon)
+
+    # Infer activities
+    i = 0
+    while i < len(gpsTraces) - 1:
+
+        # Skip over any black points at the beginning
+        while i < len(gpsTraces) - 1 and gpsTraces.accuracy[i] >= gpsAccuracyThreshold:
+            i += 1
+
+        # Create a collection of successive points that lie within a circle of radius maxRadius meters, such that no
+        # two consecutive points in space are separated by more than minSamplingRate milliseconds
+        j = i + 1
+        cluster = ActivityCluster(coordinates, i, maxRadius, projection)
+        while (j < len(gpsTraces) and gpsTraces.accuracy[j] < gpsAccuracyThreshold
+                and gpsTraces.epochTime[j] - gpsTraces.epochTime[j-1] < minSamplingRate
+                and cluster.fits(j)):
+            cluster.add()
+            j += 1
+
+        # Check for black points
+        k = j
+        while k < len(gpsTraces) and gpsTraces.accuracy[k] >= gpsAccuracyThreshold:
+            k += 1
+        if k > j:
+            if k < len(gpsTraces):
+                if cluster.fits(k):
+                    j = k + 1
+
+        # Check if the duration over which these points were collected exceeds minDuration milliseconds
+        if gpsTraces.epochTime[j-1] - gpsTraces.epochTime[i] > minDuration:
+
+            # Check if the activity is separated in space from previous activity by at least minSeparationDistance meters
+            # and separated in time by minSeparationTime milliseconds
+            if (len(activities) > 0 and gpsTraces.epochTime[j-1] - gpsTraces.epochTime[activities[-1][1]] < minSeparationTime
+                    and calDistanceBetweenPoints(activityMedian, activities[-1][1],
+                    coordinates[i:j-1]) < minSeparationDistance):
+                activities[-1][-1] = j-1
+            else:
+                activities.append([i, j-1])
+                activityMedian = PointMedian(coordinates, i, j-1)
+            i = j - 1
+        else:
+            i += 1
+
+        if k == len(gpsTraces):
+            break
+
+    # Impute trips and identify holes in data, at the gaps where trips and activities are split
+    gaps = samplingGaps.findGaps(gpsTraces.epochTime, minSamplingRate)
+    return separateEvents(activities, len(gpsTraces), gaps)